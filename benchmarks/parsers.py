@@ -0,0 +1,189 @@
+"""Compare the OpenMeteo parsers with the loop based ones they replaced
+
+Requests no longer parse the whole climate response: the daily series is parsed once
+into the climate store, and each request reads the same day from it ("climate_store"
+below). OpenMeteoParser.historical_data is benchmarked as the one-off parse.
+
+Run from the repository root:
+
+    python -m benchmarks.parsers            # recorded fixtures if present, otherwise synthetic data
+    python -m benchmarks.parsers --record   # record fixtures from the live OpenMeteo API first
+"""
+import argparse
+import asyncio
+import json
+import random
+import timeit
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from models.weather import AirQuality, ClimateStats
+from utils.climate_store import ClimateSeries
+from utils.parsers.open_meteo import (
+    AIR_QUALITY_POLLUTANTS,
+    CLIMATE_METRICS,
+    OpenMeteoParser,
+)
+
+FIXTURES = Path(__file__).parent / "fixtures"
+LOCATION = {"latitude": 51.5074, "longitude": 0.1278}
+
+
+def legacy_historical_data(response: dict) -> ClimateStats:
+    """OpenMeteoParser.historical_data before it was vectorized"""
+    climate_stats = []
+    new_keys = [*CLIMATE_METRICS, "title"]
+    today = date.today().strftime("%m-%d")
+    for x, *params in zip(
+        response["daily"]["time"],
+        *[response["daily"][series] for series in CLIMATE_METRICS.values()],
+    ):
+        temp_dict = {}
+        year, month_day = x.split("-", 1)
+        all_params = params + [year]
+        if month_day == today:
+            for metric, key in zip(all_params, new_keys):
+                if metric:
+                    temp_dict[key] = metric
+                else:
+                    temp_dict[key] = 0
+            climate_stats.append(temp_dict)
+    return ClimateStats(climate=climate_stats)
+
+
+def legacy_air_quality(response: dict) -> AirQuality:
+    """OpenMeteoParser.air_quality before it was vectorized"""
+    air_quality = {}
+    for x, *params in zip(
+        response["hourly"]["time"],
+        *[response["hourly"][pollutant] for pollutant in AIR_QUALITY_POLLUTANTS],
+    ):
+        if x.split("T")[0] not in air_quality:
+            air_quality[x.split("T")[0]] = [0] * len(params)
+        for idx, aqi in enumerate(params):
+            if aqi:
+                air_quality[x.split("T")[0]][idx] = (
+                    aqi
+                    if air_quality[x.split("T")[0]][idx] < aqi
+                    else air_quality[x.split("T")[0]][idx]
+                )
+    return AirQuality(aqi=air_quality)
+
+
+def synthetic_climate() -> dict:
+    days = (date(2025, 12, 31) - date(2000, 1, 1)).days + 1
+    return {
+        "daily": {
+            "time": [str(date(2000, 1, 1) + timedelta(days=i)) for i in range(days)],
+            **{
+                series: [
+                    round(random.uniform(0, 30), 1) if random.random() > 0.02 else None
+                    for _ in range(days)
+                ]
+                for series in CLIMATE_METRICS.values()
+            },
+        }
+    }
+
+
+def synthetic_air_quality() -> dict:
+    start = datetime.combine(date.today(), datetime.min.time())
+    hours = 5 * 24
+    return {
+        "hourly": {
+            "time": [
+                (start + timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M")
+                for i in range(hours)
+            ],
+            **{
+                pollutant: [
+                    random.randint(0, 100) if random.random() > 0.05 else None
+                    for _ in range(hours)
+                ]
+                for pollutant in AIR_QUALITY_POLLUTANTS
+            },
+        }
+    }
+
+
+async def record() -> None:
+    """Record the OpenMeteo responses used by the benchmark"""
+    from services.http_client import UpstreamClient
+    from services.open_meteo import OpenMeteoAPI
+
+    api = OpenMeteoAPI(client=UpstreamClient())
+    FIXTURES.mkdir(exist_ok=True)
+    original = api.parser
+    responses = {}
+
+    class Recorder:
+        @staticmethod
+        def air_quality(response):
+            responses["air_quality"] = response
+
+    api.parser = Recorder()
+    await api.get_air_quality(dict(LOCATION))
+    api.parser = original
+    # The climate series is read from the store when serving, record the raw response
+    responses["climate"] = await api.get_api_response(
+        "climate", api.climate_params("metric"), dict(LOCATION)
+    )
+    await api.client.close()
+    for name, response in responses.items():
+        (FIXTURES / f"{name}.json").write_text(json.dumps(response))
+
+
+def load(name: str, synthetic) -> tuple[dict, str]:
+    path = FIXTURES / f"{name}.json"
+    if path.exists():
+        return json.loads(path.read_text()), "recorded"
+    return synthetic(), "synthetic"
+
+
+def bench(name: str, legacy, current, response: dict, source: str) -> None:
+    assert legacy(response).dict(include={"aqi", "climate"}) == current(response).dict(
+        include={"aqi", "climate"}
+    ), f"{name}: outputs differ"
+    runs = 50
+    old = min(timeit.repeat(lambda: legacy(response), number=runs, repeat=5)) / runs
+    new = min(timeit.repeat(lambda: current(response), number=runs, repeat=5)) / runs
+    print(
+        f"{name:<16} {source:<10} legacy {old * 1000:7.3f} ms   "
+        f"numpy {new * 1000:7.3f} ms   {old / new:5.1f}x"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--record", action="store_true", help="record fixtures first")
+    if parser.parse_args().record:
+        asyncio.run(record())
+
+    climate, source = load("climate", synthetic_climate)
+    bench(
+        "historical_data",
+        legacy_historical_data,
+        OpenMeteoParser.historical_data,
+        climate,
+        source,
+    )
+    series = ClimateSeries.from_response(climate)
+    bench(
+        "climate_store",
+        legacy_historical_data,
+        lambda response: OpenMeteoParser.climate_stats(*series.same_day(date.today())),
+        climate,
+        source,
+    )
+    air_quality, source = load("air_quality", synthetic_air_quality)
+    bench(
+        "air_quality",
+        legacy_air_quality,
+        OpenMeteoParser.air_quality,
+        air_quality,
+        source,
+    )
+
+
+if __name__ == "__main__":
+    main()
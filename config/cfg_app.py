@@ -2,6 +2,8 @@ import os
 
 import aioredis
 import sentry_sdk
+from config import pools, upstream
+from config.firebase import users
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
@@ -11,8 +13,11 @@ from fastapi_csrf_protect.exceptions import CsrfProtectError
 from fastapi_limiter import FastAPILimiter
 from models.security import CsrfSettings
 from routes.auth import router as auth_router
+from routes.metrics import router as metrics_router
 from routes.payment import router as payment_router
 from routes.weather import router as weather_router
+from utils.cache import RedisCache
+from utils.compression import CompressionMiddleware
 
 
 def initialize_middleware(app: FastAPI) -> None:
@@ -25,8 +30,13 @@ def initialize_middleware(app: FastAPI) -> None:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        # The frontend reads the ETag to send it back in If-None-Match
+        expose_headers=["ETag"],
     )
 
+    # Compress the responses the client accepts compressed
+    app.add_middleware(CompressionMiddleware)
+
     # Set trusted hosts
     app.add_middleware(
         TrustedHostMiddleware,
@@ -50,6 +60,18 @@ def initialize_middleware(app: FastAPI) -> None:
         )
         await FastAPILimiter.init(redis)
 
+        # Share the upstream response cache and city index between workers through Redis
+        await upstream.startup(redis)
+
+        # Share the cached users and tiers between workers through Redis
+        users.store = RedisCache(redis, prefix="", stats_key="user-cache-stats")
+
+    # Close the upstream connection pools and response cache, stop the SDK thread pools
+    @app.on_event("shutdown")
+    async def shutdown():
+        await upstream.shutdown()
+        pools.shutdown()
+
 
 def initialize_app(app: FastAPI) -> None:
     """Initialize the FastAPI application with various middleware and settings."""
@@ -79,5 +101,6 @@ def initialize_app(app: FastAPI) -> None:
     app.include_router(weather_router)
     app.include_router(auth_router)
     app.include_router(payment_router)
+    app.include_router(metrics_router)
 
     return app
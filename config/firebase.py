@@ -2,7 +2,10 @@ import json
 import os
 
 import pyrebase
+from config.pools import firebase_pool
 from dotenv import load_dotenv
+from services.firebase_tokens import TokenVerifier
+from services.users import UserService
 
 load_dotenv()
 
@@ -11,3 +14,12 @@ config = os.getenv("FIREBASE_CONFIG")
 firebase = pyrebase.initialize_app(json.loads(config))
 auth = firebase.auth()
 db = firebase.database()
+
+# Cached lookups of the users and their tiers, shared between workers through Redis once the app starts.
+# ID tokens are verified locally against Google's public certificates.
+users = UserService(
+    auth,
+    db,
+    verifier=TokenVerifier(project_id=json.loads(config)["projectId"]),
+    pool=firebase_pool,
+)
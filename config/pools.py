@@ -0,0 +1,21 @@
+from utils.concurrency import BlockingPool
+from utils.settings import BLOCKING_POOLS
+
+# Thread pools for the blocking Pyrebase and Stripe calls, so they never block the event loop
+firebase_pool = BlockingPool("firebase", **BLOCKING_POOLS["firebase"])
+stripe_pool = BlockingPool("stripe", **BLOCKING_POOLS["stripe"])
+
+
+def stats() -> dict[str, dict[str, int]]:
+    """Get the counters of the thread pools
+
+    Returns:
+        dict[str, dict[str, int]]: counters of each pool, by its name
+    """
+    return {pool.name: pool.stats() for pool in (firebase_pool, stripe_pool)}
+
+
+def shutdown() -> None:
+    """Stop the thread pools, called on app shutdown"""
+    firebase_pool.shutdown()
+    stripe_pool.shutdown()
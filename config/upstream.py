@@ -0,0 +1,65 @@
+import asyncio
+from typing import TYPE_CHECKING
+
+import sentry_sdk
+from services.http_client import UpstreamClient
+from utils.cache import MemoryCache, RedisCache, ResponseCache, SQLiteCache
+from utils.city_index import CityIndex
+from utils.climate_archive import ClimateArchive
+from utils.climate_store import ClimateStore
+from utils.quota import QuotaScheduler, RedisTokenBucket, TokenBucket
+from utils.settings import HOT_REFRESH, OPEN_WEATHER_QUOTA, RESPONSE_CACHE_SIZE
+
+if TYPE_CHECKING:
+    from aioredis import Redis
+
+# Shared cache and client for the upstream weather APIs, opened on app startup and closed on app shutdown
+cache: ResponseCache = SQLiteCache("demo_cache.sqlite")
+client = UpstreamClient(cache=cache)
+city_index = CityIndex(store=cache)
+climate_store = ClimateStore()
+climate_archive = ClimateArchive()
+# Composed weather responses, pre-serialized
+responses = MemoryCache(size=RESPONSE_CACHE_SIZE)
+# Calls per minute of the OpenWeatherMap plan
+open_weather_quota = QuotaScheduler(
+    "OpenWeatherMap",
+    TokenBucket(OPEN_WEATHER_QUOTA["calls_per_minute"], OPEN_WEATHER_QUOTA["burst"]),
+    OPEN_WEATHER_QUOTA["max_wait"],
+)
+refresher: asyncio.Task | None = None
+
+
+async def startup(redis: "Redis | None" = None) -> None:
+    """Open the upstream response cache and the climate archive, start refreshing the most requested responses in the background
+
+    Args:
+        redis: connection used to share the cache, the city index and the upstream quota between workers, the local SQLite cache is used if not given
+    """
+    global cache, refresher
+    if redis is not None:
+        cache = client.cache = RedisCache(redis)
+        city_index.store = RedisCache(redis, prefix="", stats_key="city-index-stats")
+        open_weather_quota.bucket = RedisTokenBucket(
+            OPEN_WEATHER_QUOTA["calls_per_minute"],
+            OPEN_WEATHER_QUOTA["burst"],
+            redis=redis,
+        )
+    await cache.open()
+    climate_archive.open()
+    refresher = asyncio.create_task(client.refresh_hot(**HOT_REFRESH))
+    refresher.add_done_callback(_refresher_done)
+
+
+def _refresher_done(task: asyncio.Task) -> None:
+    """Report the error that stopped the background refreshes, they only stop on shutdown otherwise"""
+    if not task.cancelled() and task.exception() is not None:
+        sentry_sdk.capture_exception(task.exception())
+
+
+async def shutdown() -> None:
+    """Stop the background refreshes, close the upstream connection pools and response cache"""
+    if refresher is not None:
+        refresher.cancel()
+    await client.close()
+    await cache.close()
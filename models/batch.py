@@ -0,0 +1,39 @@
+from typing import Literal, Optional
+
+from models.security import AuthToken
+from pydantic import BaseModel, conlist, root_validator
+from utils.settings import BATCH_LIMITS
+
+
+class Location(BaseModel):
+    """Location of a batch weather request, a city name or a set of coordinates"""
+
+    city: Optional[str] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+
+    @root_validator(skip_on_failure=True)
+    def city_or_coordinates(cls, values):
+        if values["city"] is None and (values["lat"] is None or values["lon"] is None):
+            raise ValueError("Either city or lat and lon are required")
+        return values
+
+    def query(self, units: str) -> dict:
+        """Get the query params of the location
+
+        Args:
+            units: units of measurement, can be metric or imperial
+
+        Returns:
+            dict: query params for the API call, the coordinates are used if both are given
+        """
+        if self.lat is not None and self.lon is not None:
+            return {"lat": self.lat, "lon": self.lon, "units": units}
+        return {"q": self.city, "units": units}
+
+
+class WeatherBatch(AuthToken):
+    """Batch weather request, the locations share one auth check"""
+
+    locations: conlist(Location, min_items=1, max_items=BATCH_LIMITS["max_locations"])
+    units: Literal["metric", "imperial"] = "metric"
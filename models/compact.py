@@ -0,0 +1,182 @@
+import sys
+from dataclasses import dataclass, replace
+
+import numpy as np
+import orjson
+from models.weather import Forecast, ThreeHourWeather
+
+# Fields of ThreeHourWeather by how they are stored, the response keeps the order of the model
+INT_FIELDS = ["dt", "pressure", "humidity", "clouds", "visibility"]
+FLOAT_FIELDS = [
+    "temp",
+    "temp_min",
+    "temp_max",
+    "feels_like",
+    "wind_speed",
+    "rain",
+    "rain_prob",
+]
+CATEGORICAL_FIELDS = ["weather_main", "weather_description", "weather_icon", "pod"]
+
+
+class Vocabulary:
+    """Interned strings shared by all compact forecasts, each string is stored once and referenced by its code"""
+
+    def __init__(self):
+        self.strings: list[str] = []
+        self.codes: dict[str, int] = {}
+
+    def encode(self, values: list[str]) -> list[int]:
+        """Get the codes of strings, adding the new ones
+
+        Args:
+            values: strings to encode
+
+        Returns:
+            list[int]: code of each string
+        """
+        for value in values:
+            if value not in self.codes:
+                self.codes[value] = len(self.strings)
+                self.strings.append(sys.intern(value))
+        return [self.codes[value] for value in values]
+
+    def decode(self, codes: np.ndarray) -> list[str]:
+        """Get the strings of codes
+
+        Args:
+            codes: codes to decode
+
+        Returns:
+            list[str]: string of each code
+        """
+        return [self.strings[code] for code in codes.tolist()]
+
+
+STRINGS = Vocabulary()
+
+
+@dataclass(frozen=True, slots=True)
+class CompactForecast:
+    """Compact form of a Forecast, kept in memory for the cached cities
+
+    The forecasts are stored as columns: one int64 and one float64 array for the
+    numeric fields, and the codes of the categorical strings in the shared vocabulary.
+    It only becomes the public Forecast model at the response boundary (to_model or json_bytes).
+    """
+
+    name: str
+    country: str
+    lat: float
+    lon: float
+    ints: np.ndarray
+    floats: np.ndarray
+    categories: np.ndarray
+
+    @classmethod
+    def from_forecasts(
+        cls, name: str, country: str, lat: float, lon: float, forecasts: list[dict]
+    ) -> "CompactForecast":
+        """Build the compact forecast from the forecast data
+
+        Args:
+            name: city name
+            country: country code
+            lat: latitude
+            lon: longitude
+            forecasts: 3 hour forecasts, with the fields of ThreeHourWeather
+
+        Returns:
+            CompactForecast: compact forecast, numeric fields are coerced like the pydantic model does
+        """
+        dt_txt = np.array(
+            [forecast["dt_txt"] for forecast in forecasts], dtype="datetime64[s]"
+        )
+        ints = np.array(
+            [[forecast[field] for field in INT_FIELDS] for forecast in forecasts],
+            dtype=float,
+        ).reshape(len(forecasts), len(INT_FIELDS))
+        floats = np.array(
+            [[forecast[field] for field in FLOAT_FIELDS] for forecast in forecasts],
+            dtype=float,
+        ).reshape(len(forecasts), len(FLOAT_FIELDS))
+        categories = np.array(
+            [
+                STRINGS.encode([str(forecast[field]) for field in CATEGORICAL_FIELDS])
+                for forecast in forecasts
+            ],
+            dtype=np.uint32,
+        ).reshape(len(forecasts), len(CATEGORICAL_FIELDS))
+        return cls(
+            name=str(name),
+            country=str(country),
+            lat=float(lat),
+            lon=float(lon),
+            ints=np.column_stack([ints.astype(np.int64), dt_txt.astype(np.int64)]),
+            floats=floats,
+            categories=categories,
+        )
+
+    def copy(self, update: dict[str, float | str] | None = None) -> "CompactForecast":
+        """Copy the forecast with another location, the forecasts are shared
+
+        Args:
+            update: new values of name, country, lat or lon
+
+        Returns:
+            CompactForecast: updated copy of the forecast
+        """
+        return replace(self, **(update or {}))
+
+    def rows(self) -> list[dict[str, int | float | str]]:
+        """Get the forecasts in the schema of ThreeHourWeather
+
+        Returns:
+            list[dict[str, int | float | str]]: fields of each 3 hour forecast
+        """
+        columns = dict(zip(INT_FIELDS, self.ints[:, : len(INT_FIELDS)].T.tolist()))
+        columns.update(zip(FLOAT_FIELDS, self.floats.T.tolist()))
+        columns.update(
+            (field, STRINGS.decode(codes))
+            for field, codes in zip(CATEGORICAL_FIELDS, self.categories.T)
+        )
+        columns["dt_txt"] = [
+            text.replace("T", " ")
+            for text in np.datetime_as_string(
+                self.ints[:, -1].astype("datetime64[s]")
+            ).tolist()
+        ]
+        fields = list(ThreeHourWeather.__fields__)
+        return [
+            dict(zip(fields, row)) for row in zip(*[columns[field] for field in fields])
+        ]
+
+    def to_model(self) -> Forecast:
+        """Get the public Forecast model, without validating the data again
+
+        Returns:
+            Forecast: 5 day forecast data for the city (in 3 hour intervals)
+        """
+        return Forecast.construct(
+            name=self.name,
+            country=self.country,
+            lat=self.lat,
+            lon=self.lon,
+            forecasts=[ThreeHourWeather.construct(**row) for row in self.rows()],
+        )
+
+    def json_bytes(self) -> bytes:
+        """Serialize the forecast to JSON in the schema of Forecast
+
+        Returns:
+            bytes: JSON of the forecast
+        """
+        return orjson.dumps(
+            {
+                "name": self.name,
+                "country": self.country,
+                "lat": self.lat,
+                "lon": self.lon,
+                "forecasts": self.rows(),
+            }
+        )
@@ -1,7 +1,32 @@
-from pydantic import BaseModel
+import orjson
+from pydantic import BaseModel, PrivateAttr
 
 
-class BaseWeather(BaseModel):
+class SerializedModel(BaseModel):
+    """Pydantic model that keeps its JSON serialization once it is serialized
+
+    Parsed models are shared between requests, so they must not be mutated, use copy(update=...) instead.
+    """
+
+    _json: bytes | None = PrivateAttr(default=None)
+
+    def json_bytes(self) -> bytes:
+        """Serialize the model to JSON, only the first time
+
+        Returns:
+            bytes: JSON of the model
+        """
+        if self._json is None:
+            self._json = orjson.dumps(self.dict())
+        return self._json
+
+    def copy(self, **kwargs) -> "SerializedModel":
+        model = super().copy(**kwargs)
+        model._json = None
+        return model
+
+
+class BaseWeather(SerializedModel):
     """Pydantic model for weather data validation"""
 
     dt: int
@@ -20,16 +45,19 @@ class BaseWeather(BaseModel):
     weather_icon: str
 
 
-class ClimateStats(BaseModel):
+class ClimateStats(SerializedModel):
     """Pydantic model for climate statistics data validation"""
 
     climate: list[dict[str, float | int]]
+    summary: dict[str, dict[str, float]] = {}
 
 
-class AirQuality(BaseModel):
+class AirQuality(SerializedModel):
     """Pydantic model for air quality data validation"""
 
     aqi: dict[str, list[int]]
+    mean: dict[str, list[float]] = {}
+    percentiles: dict[str, dict[str, list[float]]] = {}
 
 
 class CurrentWeather(BaseWeather):
@@ -50,7 +78,7 @@ class ThreeHourWeather(BaseWeather):
     dt_txt: str
 
 
-class Forecast(BaseModel):
+class Forecast(SerializedModel):
     """Pydantic model for forecast data validation"""
 
     name: str
@@ -58,3 +86,37 @@ class Forecast(BaseModel):
     lat: float
     lon: float
     forecasts: list[ThreeHourWeather]
+    _forecasts_json: bytes | None = PrivateAttr(default=None)
+
+    def json_bytes(self) -> bytes:
+        """Serialize the forecast to JSON, the forecasts are only serialized the first time,
+        even for copies with another location
+
+        Returns:
+            bytes: JSON of the forecast
+        """
+        if self._json is None:
+            location = orjson.dumps(self.dict(exclude={"forecasts"}))
+            self._json = location[:-1] + b',"forecasts":' + self.forecasts_json() + b"}"
+        return self._json
+
+    def forecasts_json(self) -> bytes:
+        """Serialize the forecasts to JSON, only the first time
+
+        Returns:
+            bytes: JSON of the forecasts
+        """
+        if self._forecasts_json is None:
+            self._forecasts_json = orjson.dumps(
+                [forecast.dict() for forecast in self.forecasts]
+            )
+        return self._forecasts_json
+
+    def copy(self, **kwargs) -> "Forecast":
+        if "forecasts" in (kwargs.get("update") or {}):
+            model = super().copy(**kwargs)
+            model._forecasts_json = None
+            return model
+        # Serialized on the shared model, so that all of its copies reuse it
+        self.forecasts_json()
+        return super().copy(**kwargs)
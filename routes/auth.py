@@ -1,4 +1,5 @@
-from config.firebase import auth, db
+from config.firebase import auth, db, users
+from config.pools import firebase_pool
 from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from fastapi.responses import JSONResponse
 from fastapi_csrf_protect import CsrfProtect
@@ -41,26 +42,31 @@ async def login(
 
     # Get user account info
     try:
-        user = auth.get_account_info(authToken.token)
-        g_uid = user["users"][0]["localId"]
+        user = await users.verify(authToken.token)
+        g_uid = user["user_id"]
         response.set_cookie(key="token", value=authToken.token)
 
         # Get user details from database
-        user_db = db.child("users").child(g_uid).get().val()
+        user_db = await firebase_pool.run(
+            lambda: db.child("users").child(g_uid).get().val()
+        )
         tier = None
 
         # If user is not in database, add them as a free user
         if not user_db:
-            db.child("users").child(g_uid).update({"tier": "free"})
+            await firebase_pool.run(
+                lambda: db.child("users").child(g_uid).update({"tier": "free"})
+            )
             tier = "free"
         else:
             tier = user_db["tier"]
+        await users.remember(authToken.token, g_uid, tier)
 
         # Return user details
         return {
             "detail": "Login successful",
             "status_code": 200,
-            "user": user["users"][0]["displayName"],
+            "user": user.get("name"),
             "tier": tier,
         }
     # If there is an error from Firebase (Pyrebase), handle it.
@@ -94,11 +100,14 @@ async def refresh(
     try:
         # Get new token
         # if authToken.token == request.cookies["token"]:
-        user = auth.refresh(authToken.refreshToken)
+        user = await firebase_pool.run(auth.refresh, authToken.refreshToken)
         response.set_cookie(key="token", value=user["idToken"])
 
         # Get user tier and return it
-        tier = db.child("users").child(user["userId"]).get().val()["tier"]
+        tier = await firebase_pool.run(
+            lambda: db.child("users").child(user["userId"]).get().val()["tier"]
+        )
+        await users.remember(user["idToken"], user["userId"], tier)
         return {"detail": "Refresh successful", "tier": tier}
         # else:
         #     raise HTTPException(detail="Token is invalid", status_code=400)
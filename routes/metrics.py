@@ -0,0 +1,37 @@
+import os
+
+from config import pools, upstream
+from fastapi import APIRouter, Depends, HTTPException, Request
+
+router = APIRouter()
+
+
+def internal_host(request: Request) -> None:
+    """Only serve the request on the secret host, the other trusted hosts must not see it
+
+    Args:
+        request: incoming request
+
+    Raises:
+        HTTPException: if the request was not sent to the secret host
+    """
+    if request.headers.get("host") != os.getenv("SECRET_HOST_HEADER"):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+
+@router.get("/metrics", dependencies=[Depends(internal_host)])
+async def metrics():
+    """Get the counters of the upstream response cache, of the composed response cache,
+    of the upstream circuit breakers, of the OpenWeatherMap quota and of the thread
+    pools for the blocking SDK calls
+
+    Returns:
+        dict: cache hits and misses, breaker states, quota burn, calls running and queued in each pool
+    """
+    return {
+        "cache": await upstream.cache.stats(),
+        "responses": await upstream.responses.stats(),
+        "upstreams": upstream.client.stats(),
+        "quota": await upstream.open_weather_quota.stats(),
+        "pools": pools.stats(),
+    }
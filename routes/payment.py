@@ -1,7 +1,8 @@
 import os
 
 import stripe
-from config.firebase import auth, db
+from config.firebase import db, users
+from config.pools import firebase_pool, stripe_pool
 from dotenv import load_dotenv
 from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from fastapi.responses import RedirectResponse
@@ -32,10 +33,11 @@ async def create_checkout_session(
     # Create payment session on stripe
     try:
         # get user details
-        user = auth.get_account_info(authToken.token)
+        user = await users.verify(authToken.token)
 
         # create payment session
-        payment_session = stripe.checkout.Session.create(
+        payment_session = await stripe_pool.run(
+            stripe.checkout.Session.create,
             mode="payment",
             payment_method_types=["card"],
             line_items=[
@@ -44,13 +46,15 @@ async def create_checkout_session(
                     "quantity": 1,
                 },
             ],
-            success_url=f"""http://localhost:8000/payment-success?session_id={"{CHECKOUT_SESSION_ID}"}&guid={user["users"][0]['localId']}""",
+            success_url=f"""http://localhost:8000/payment-success?session_id={"{CHECKOUT_SESSION_ID}"}&guid={user["user_id"]}""",
             cancel_url=f"http://localhost:8000/cancel",
         )
 
         # update user details with verification token for payment
-        db.child("users").child(user["users"][0]["localId"]).update(
-            {"verificationToken": payment_session.id}
+        await firebase_pool.run(
+            lambda: db.child("users")
+            .child(user["user_id"])
+            .update({"verificationToken": payment_session.id})
         )
 
         # return payment session details
@@ -77,13 +81,16 @@ async def payment_success(session_id: str, guid: str):
     # Verify payment session
     try:
         # Get the verification token from the database
-        verification_token = (
-            db.child("users").child(guid).get().val()["verificationToken"]
+        verification_token = await firebase_pool.run(
+            lambda: db.child("users").child(guid).get().val()["verificationToken"]
         )
 
         # If the verification token matches the session id, update the user's tier to paid
         if session_id == verification_token:
-            db.child("users").child(guid).update({"tier": "paid"})
+            await firebase_pool.run(
+                lambda: db.child("users").child(guid).update({"tier": "paid"})
+            )
+            await users.invalidate(guid)
             return RedirectResponse(url=f"http://localhost:3000/")
         else:
             raise HTTPException(
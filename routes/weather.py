@@ -1,15 +1,41 @@
+import asyncio
+import hashlib
 import os
+import time
+from typing import Any, AsyncIterator
 
-from config.firebase import auth, db
+import orjson
+import sentry_sdk
+from config.firebase import users
+from config.upstream import city_index, responses
 from dotenv import load_dotenv
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from fastapi_limiter.depends import RateLimiter
+from models.batch import WeatherBatch
 from models.security import AuthToken
 from requests.exceptions import HTTPError
+from services.http_client import upstream_expiries
 from services.open_meteo import OpenMeteoAPI
 from services.open_weather_api import OpenWeatherAPI
+from utils.compression import compress, negotiate
+from utils.concurrency import SingleFlight, with_deadline
 from utils.errors import handle_exception, handle_pyrebase
-from utils.settings import UNITS
+from utils.serialization import (
+    NDJSON_MEDIA_TYPE,
+    SerializedJSONResponse,
+    ndjson_line,
+)
+from utils.quota import quota_priority
+from utils.services import etag_matches, normalize_city
+from utils.settings import (
+    BATCH_LIMITS,
+    CACHE_TTL,
+    COMPRESSION,
+    PARTIAL_RESPONSE_TTL,
+    UNITS,
+    UPSTREAM_DEADLINES,
+)
 
 router = APIRouter()
 
@@ -18,49 +44,439 @@ load_dotenv()
 api = OpenWeatherAPI(api_key=os.getenv("OPEN_WEATHER_API_KEY"))
 alt_api = OpenMeteoAPI()
 
+# Upstream calls each response shape is composed from
+RESPONSE_SECTIONS = {
+    "free": ("weather", "forecast"),
+    "paid": ("weather", "forecast", "air-quality", "climate"),
+}
+response_flights = SingleFlight()
+# Locations fetched at once by the batch requests of this worker
+batch_slots = asyncio.Semaphore(BATCH_LIMITS["concurrency"])
+
+
+# Keys of the composed response, in the order they are serialized
+RESPONSE_KEYS = (
+    "weather",
+    "forecast",
+    "units",
+    "air_quality",
+    "historical",
+    "historical_summary",
+    "unavailable",
+)
+
+
+async def call_api_sections(
+    query: dict, tier: str = "free"
+) -> AsyncIterator[tuple[str, Any]]:
+    """Call the OpenWeatherMap API, and the OpenMeteo API for paid users, yielding each
+    section of the response as soon as its upstream call finishes
+
+    Calls that do not depend on each other run concurrently, each with its own deadline.
+    The paid-only sections are optional: if their call fails for any reason (e.g. timeout,
+    open circuit breaker, invalid response), the response is sent without them and lists
+    them as unavailable.
+
+    Args:
+        query: query params for the API call
+        tier: tier of the user, paid users also get the OpenMeteo sections
+
+    Raises:
+        HTTPException: if the weather or the forecast cannot be fetched
+
+    Yields:
+        tuple[str, Any]: key and value of each section of the response
+    """
+
+    def branch(name: str, awaitable) -> asyncio.Task:
+        return asyncio.create_task(
+            with_deadline(awaitable, UPSTREAM_DEADLINES[name], name)
+        )
+
+    def optional_branch(name: str, awaitable) -> asyncio.Task:
+        async def run():
+            try:
+                return await with_deadline(awaitable, UPSTREAM_DEADLINES[name], name)
+            except Exception as e:
+                sentry_sdk.capture_exception(e)
+                return None
+
+        return asyncio.create_task(run())
+
+    # Paid users get the upstream quota first
+    quota_priority.set("paid" if tier == "paid" else "free")
+
+    # Look up known cities by their coordinates, so they share cache entries with coordinate queries
+    place = await city_index.get(query["q"]) if "q" in query else None
+    if place is not None:
+        query = {"lat": place["lat"], "lon": place["lon"], "units": query["units"]}
+
+    tasks = {
+        branch("weather", api.get_weather(query)): "weather",
+        branch("forecast", api.get_forecast(query)): "forecast",
+    }
+    try:
+        if tier == "paid":
+            # OpenMeteo only needs the coordinates, wait for the current weather only if they are not known yet
+            if "lat" in query and "lon" in query:
+                lat, lon = query["lat"], query["lon"]
+            else:
+                current = await next(iter(tasks))
+                lat, lon = current.lat, current.lon
+            air_quality = optional_branch(
+                "air-quality",
+                alt_api.get_air_quality({"latitude": lat, "longitude": lon}),
+            )
+            climate = optional_branch(
+                "climate",
+                alt_api.get_historical_data(
+                    {"latitude": lat, "longitude": lon, "units": query["units"]}
+                ),
+            )
+            tasks[air_quality] = "air-quality"
+            tasks[climate] = "climate"
 
-def call_api(query: str, tier: str = "free") -> dict:
-    """Call the OpenWeatherMap API
+        done = {}
+        unavailable = []
+        pending = set(tasks)
+        while pending:
+            finished, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in finished:
+                name, result = tasks[task], task.result()
+                if name in ("weather", "forecast"):
+                    if "lat" in query and "lon" in query:
+                        # The upstream APIs are called with snapped coordinates, report the requested ones
+                        result = result.copy(
+                            update={"lat": query["lat"], "lon": query["lon"]}
+                        )
+                    if name == "forecast" and place is not None:
+                        result = result.copy(
+                            update={"name": place["name"], "country": place["country"]}
+                        )
+                    done[name] = result
+                    yield name, result
+                    if name == "weather":
+                        yield "units", UNITS[query["units"]]
+                elif name == "air-quality":
+                    if result is None:
+                        unavailable.append("air_quality")
+                    yield "air_quality", result.aqi if result else None
+                else:
+                    if result is None:
+                        unavailable.append("historical")
+                    yield "historical", result.climate if result else None
+                    yield "historical_summary", result.summary if result else None
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    if place is None and "q" in query:
+        await city_index.learn(
+            query["q"],
+            {
+                "lat": done["weather"].lat,
+                "lon": done["weather"].lon,
+                "name": done["forecast"].name,
+                "country": done["forecast"].country,
+            },
+        )
+    if unavailable:
+        yield "unavailable", sorted(unavailable)
+
+
+async def call_api(query: dict, tier: str = "free") -> dict:
+    """Call the OpenWeatherMap API, and the OpenMeteo API for paid users
 
     Args:
         query: query params for the API call
+        tier: tier of the user, paid users also get the OpenMeteo sections
 
     Returns:
         dict: weather data for query params
     """
-    weather = api.get_weather(query)
-    forecast = api.get_forecast(query)
+    sections = {key: value async for key, value in call_api_sections(query, tier)}
+    return {key: sections[key] for key in RESPONSE_KEYS if key in sections}
 
-    if tier == "paid":
-        air_quality = alt_api.get_air_quality(
-            {"latitude": weather.lat, "longitude": weather.lon}
-        )
-        historical = alt_api.get_historical_data(
-            {"latitude": weather.lat, "longitude": weather.lon, "units": query["units"]}
+
+def response_key(query: dict, tier: str) -> str:
+    """Get the key of a composed response in the response cache
+
+    Args:
+        query: query params for the API call
+        tier: tier of the user, free or paid
+
+    Returns:
+        str: key of the response
+    """
+    location = (
+        f"q={normalize_city(query['q'])}"
+        if "q" in query
+        else f"lat={query['lat']}&lon={query['lon']}"
+    )
+    return f"{tier}:{query['units']}:{location}"
+
+
+async def store_response(
+    key: str, tier: str, response: dict, expiries: list[float] | None = None
+) -> dict:
+    """Serialize a composed response and keep it in the response cache
+
+    It is cached until the first of its upstream responses stops being fresh, partial
+    responses only for a short while, so the missing sections come back soon. Responses
+    built from stale upstream responses are not cached.
+
+    Args:
+        key: key of the response, see response_key
+        tier: tier of the user, free or paid
+        response: composed response, see call_api
+        expiries: when the upstream responses it was built from stop being fresh, see upstream_expiries
+
+    Returns:
+        dict: cache entry with the body, its ETag and expiry, and its compressed variants
+    """
+    body = SerializedJSONResponse(response).body
+    now = time.time()
+    ttl = min(CACHE_TTL[section] for section in RESPONSE_SECTIONS[tier])
+    if expiries:
+        ttl = min(ttl, int(min(expiries) - now))
+    if "unavailable" in response:
+        ttl = min(ttl, PARTIAL_RESPONSE_TTL)
+    ttl = max(ttl, 0)
+    entry = {
+        "body": body,
+        "etag": f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+        "expires": now + ttl,
+        "variants": {},
+    }
+    if ttl > 0:
+        await responses.set(key, entry, ttl)
+    return entry
+
+
+async def cached_entry(query: dict, tier: str = "free") -> dict:
+    """Get the composed response of a query from the response cache, composing it on a miss
+
+    Concurrent misses of the same response share one call_api.
+
+    Args:
+        query: query params for the API call
+        tier: tier of the user, free and paid users get different responses
+
+    Returns:
+        dict: cache entry of the response, see store_response
+    """
+    tier = "paid" if tier == "paid" else "free"
+    key = response_key(query, tier)
+
+    async def compose() -> dict:
+        # Runs in its own task, the expiries of this call_api are collected here
+        expiries = []
+        upstream_expiries.set(expiries)
+        return await store_response(key, tier, await call_api(query, tier), expiries)
+
+    entry = await responses.get(key)
+    if entry is None:
+        entry = await response_flights.do(key, compose)
+    return entry
+
+
+async def cached_call_api(
+    query: dict,
+    tier: str = "free",
+    if_none_match: str | None = None,
+    accept_encoding: str | None = None,
+) -> Response:
+    """Call the weather APIs through the cache of composed responses
+
+    Identical queries of the same tier share one serialized response until the first
+    of its upstream responses expires (partial responses only for a short while, so the
+    missing sections come back soon), concurrent misses share one call_api. The response
+    has a strong ETag, clients that already have it get a 304 without a body. Compressed
+    variants are cached with the response, so each is only compressed once.
+
+    Args:
+        query: query params for the API call
+        tier: tier of the user, free and paid users get different responses
+        if_none_match: value of the If-None-Match header
+        accept_encoding: value of the Accept-Encoding header
+
+    Returns:
+        Response: weather data for query params, or 304 if the client already has it
+    """
+    entry = await cached_entry(query, tier)
+    encoding = negotiate(accept_encoding)
+    if len(entry["body"]) < COMPRESSION["minimum_size"]:
+        encoding = None
+    headers = {
+        # Each encoding is a different representation, so it gets its own strong ETag
+        "ETag": f'{entry["etag"][:-1]}-{encoding}"' if encoding else entry["etag"],
+        "Cache-Control": f"private, max-age={max(int(entry['expires'] - time.time()), 0)}",
+        "Vary": "Accept-Encoding",
+    }
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    if encoding is None:
+        return SerializedJSONResponse(entry["body"], headers=headers)
+    if encoding not in entry["variants"]:
+        entry["variants"][encoding] = compress(entry["body"], encoding)
+    headers["Content-Encoding"] = encoding
+    return SerializedJSONResponse(entry["variants"][encoding], headers=headers)
+
+
+async def streamed_call_api(query: dict, tier: str = "free") -> StreamingResponse:
+    """Stream the sections of the weather response as NDJSON, each as soon as it is ready
+
+    Each line is a section tagged with its name, e.g. {"section": "weather", "data": {...}},
+    so the current weather is shown without waiting for the slower climate data. Errors
+    before the first section are raised as usual, later ones end the stream with an
+    "error" section. The complete response is cached for the non-streamed requests.
+
+    Args:
+        query: query params for the API call
+        tier: tier of the user, free and paid users get different responses
+
+    Raises:
+        HTTPException: if the first section cannot be fetched
+
+    Returns:
+        StreamingResponse: NDJSON stream of the sections
+    """
+    tier = "paid" if tier == "paid" else "free"
+    # All upstream calls start before the first section, they add their expiries to this list
+    expiries = []
+    upstream_expiries.set(expiries)
+    sections = call_api_sections(query, tier)
+    first = await anext(sections)
+
+    async def stream() -> AsyncIterator[bytes]:
+        response = dict([first])
+        try:
+            yield ndjson_line(*first)
+            async for name, value in sections:
+                response[name] = value
+                yield ndjson_line(name, value)
+        except HTTPException as e:
+            sentry_sdk.capture_exception(e)
+            yield ndjson_line("error", {"status": e.status_code, "message": e.detail})
+            return
+        except Exception as e:
+            sentry_sdk.capture_exception(e)
+            yield ndjson_line(
+                "error", {"status": 500, "message": "Internal server error"}
+            )
+            return
+        finally:
+            # Cancels the branches still running when the client disconnects
+            await sections.aclose()
+        await store_response(
+            response_key(query, tier),
+            tier,
+            {key: response[key] for key in RESPONSE_KEYS if key in response},
+            expiries,
         )
-        return {
-            "weather": weather,
-            "forecast": forecast,
-            "units": UNITS[query["units"]],
-            "air_quality": air_quality.aqi,
-            "historical": historical.climate,
-        }
-    else:
-        return {
-            "weather": weather,
-            "forecast": forecast,
-            "units": UNITS[query["units"]],
-        }
+
+    return StreamingResponse(stream(), media_type=NDJSON_MEDIA_TYPE)
+
+
+async def batch_call_api(
+    queries: list[dict], tier: str = "free"
+) -> AsyncIterator[bytes]:
+    """Get the weather of many locations, yielding each as an NDJSON line as soon as it is ready
+
+    Repeated locations are fetched once, and the locations of all batches of a worker
+    share the batch_slots, so one large batch cannot flood the upstream APIs. Each line
+    has the index of the location in the request, and either the status and data of the
+    response or the status and message of the error, e.g. {"index": 0, "status": 200, "data": {...}}.
+
+    Args:
+        queries: query params for the API call of each location
+        tier: tier of the user, free and paid users get different responses
+
+    Yields:
+        bytes: NDJSON line of each location
+    """
+    tier = "paid" if tier == "paid" else "free"
+    indices: dict[str, list[int]] = {}
+    unique: dict[str, dict] = {}
+    for index, query in enumerate(queries):
+        key = response_key(query, tier)
+        indices.setdefault(key, []).append(index)
+        unique.setdefault(key, query)
+
+    async def fetch(key: str, query: dict) -> tuple[str, bytes]:
+        async with batch_slots:
+            try:
+                entry = await cached_entry(query, tier)
+            except HTTPException as e:
+                return key, b'"status":%d,"message":%b' % (
+                    e.status_code,
+                    orjson.dumps(e.detail),
+                )
+            except Exception as e:
+                # One failing location must not end the stream of the others
+                sentry_sdk.capture_exception(e)
+                return key, b'"status":500,"message":"Internal server error"'
+        return key, b'"status":200,"data":' + entry["body"]
+
+    tasks = [asyncio.create_task(fetch(key, query)) for key, query in unique.items()]
+    try:
+        for result in asyncio.as_completed(tasks):
+            key, line = await result
+            for index in indices[key]:
+                yield b'{"index":%d,%b}\n' % (index, line)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def weather_response(
+    query: dict,
+    tier: str = "free",
+    if_none_match: str | None = None,
+    accept_encoding: str | None = None,
+    accept: str | None = None,
+) -> Response:
+    """Get the weather response in the representation the client accepts
+
+    Args:
+        query: query params for the API call
+        tier: tier of the user, free and paid users get different responses
+        if_none_match: value of the If-None-Match header
+        accept_encoding: value of the Accept-Encoding header
+        accept: value of the Accept header, NDJSON streams the sections
+
+    Returns:
+        Response: streamed sections, or the cached composed response
+    """
+    if accept is not None and NDJSON_MEDIA_TYPE in accept:
+        return await streamed_call_api(query, tier)
+    return await cached_call_api(query, tier, if_none_match, accept_encoding)
 
 
 @handle_exception
-@router.post("/weather/city", dependencies=[Depends(RateLimiter(times=30, seconds=60))])
-async def weather_by_city(authToken: AuthToken, city: str, units: str = "metric"):
+@router.post(
+    "/weather/city",
+    dependencies=[Depends(RateLimiter(times=30, seconds=60))],
+    response_class=SerializedJSONResponse,
+)
+async def weather_by_city(
+    authToken: AuthToken,
+    city: str,
+    units: str = "metric",
+    if_none_match: str | None = Header(default=None),
+    accept_encoding: str | None = Header(default=None),
+    accept: str | None = Header(default=None),
+):
     """Get weather data for a city
 
     Args:
         city: city name
         units: units of measurement, can be metric or imperial. Defaults to "metric".
+        if_none_match: ETags of the responses the client already has
+        accept_encoding: encodings the client accepts the response in
+        accept: application/x-ndjson to stream the sections as they are ready
 
     Raises:
         e: Python exception
@@ -71,11 +487,17 @@ async def weather_by_city(authToken: AuthToken, city: str, units: str = "metric"
     """
     try:
         if authToken.token == "empty":
-            return call_api({"q": city, "units": units})
-        user = auth.get_account_info(authToken.token)
-        g_uid = user["users"][0]["localId"]
-        tier = db.child("users").child(g_uid).get().val()["tier"]
-        return call_api({"q": city, "units": units}, tier)
+            return await weather_response(
+                {"q": city, "units": units},
+                if_none_match=if_none_match,
+                accept_encoding=accept_encoding,
+                accept=accept,
+            )
+        g_uid = await users.get_uid(authToken.token)
+        tier = await users.get_tier(g_uid)
+        return await weather_response(
+            {"q": city, "units": units}, tier, if_none_match, accept_encoding, accept
+        )
     except HTTPError as e:
         response = handle_pyrebase(e)
         raise HTTPException(
@@ -85,10 +507,18 @@ async def weather_by_city(authToken: AuthToken, city: str, units: str = "metric"
 
 @handle_exception
 @router.post(
-    "/weather/coordinates", dependencies=[Depends(RateLimiter(times=30, seconds=60))]
+    "/weather/coordinates",
+    dependencies=[Depends(RateLimiter(times=30, seconds=60))],
+    response_class=SerializedJSONResponse,
 )
 async def weather_by_coordinates(
-    authToken: AuthToken, lat: float, lon: float, units: str = "metric"
+    authToken: AuthToken,
+    lat: float,
+    lon: float,
+    units: str = "metric",
+    if_none_match: str | None = Header(default=None),
+    accept_encoding: str | None = Header(default=None),
+    accept: str | None = Header(default=None),
 ):
     """Get weather data for a set of coordinates
 
@@ -96,6 +526,9 @@ async def weather_by_coordinates(
         lat: latitude
         lon: longitude
         units: units of measurement, can be metric or imperial. Defaults to "metric".
+        if_none_match: ETags of the responses the client already has
+        accept_encoding: encodings the client accepts the response in
+        accept: application/x-ndjson to stream the sections as they are ready
 
     Raises:
         e: Python exception
@@ -106,13 +539,59 @@ async def weather_by_coordinates(
     """
     try:
         if authToken.token == "empty":
-            return call_api({"lat": lat, "lon": lon, "units": units})
-        user = auth.get_account_info(authToken.token)
-        g_uid = user["users"][0]["localId"]
-        tier = db.child("users").child(g_uid).get().val()["tier"]
-        return call_api({"lat": lat, "lon": lon, "units": units}, tier)
+            return await weather_response(
+                {"lat": lat, "lon": lon, "units": units},
+                if_none_match=if_none_match,
+                accept_encoding=accept_encoding,
+                accept=accept,
+            )
+        g_uid = await users.get_uid(authToken.token)
+        tier = await users.get_tier(g_uid)
+        return await weather_response(
+            {"lat": lat, "lon": lon, "units": units},
+            tier,
+            if_none_match,
+            accept_encoding,
+            accept,
+        )
+    except HTTPError as e:
+        response = handle_pyrebase(e)
+        raise HTTPException(
+            detail=f"Error in firebase: {response[0]['error']}", status_code=response[1]
+        )
+
+
+@handle_exception
+@router.post(
+    "/weather/batch",
+    dependencies=[Depends(RateLimiter(times=10, seconds=60))],
+    response_class=StreamingResponse,
+)
+async def weather_batch(batch: WeatherBatch):
+    """Get weather data for many cities and sets of coordinates, with one auth check
+
+    Args:
+        batch: auth token, locations and units of measurement
+
+    Raises:
+        HTTPException: Firebase call failed
+
+    Returns:
+        StreamingResponse: NDJSON line of each location, in the order they are ready
+    """
+    try:
+        tier = "free"
+        if batch.token != "empty":
+            g_uid = await users.get_uid(batch.token)
+            tier = await users.get_tier(g_uid)
     except HTTPError as e:
         response = handle_pyrebase(e)
         raise HTTPException(
             detail=f"Error in firebase: {response[0]['error']}", status_code=response[1]
         )
+    return StreamingResponse(
+        batch_call_api(
+            [location.query(batch.units) for location in batch.locations], tier
+        ),
+        media_type=NDJSON_MEDIA_TYPE,
+    )
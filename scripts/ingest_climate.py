@@ -0,0 +1,94 @@
+"""Ingest the climate series of the tracked locations into the climate archive
+
+Run from the repository root:
+
+    python -m scripts.ingest_climate locations.json [--units metric] [--concurrency 8]
+
+locations.json is a list of the tracked locations, e.g. [{"lat": 51.51, "lon": -0.13}, ...].
+The running workers pick up the new archive when they restart.
+"""
+import argparse
+import asyncio
+import json
+
+import sentry_sdk
+from services.http_client import UpstreamClient
+from services.open_meteo import OpenMeteoAPI
+from utils.cache import ResponseCache
+from utils.climate_archive import ClimateArchive, ClimateArchiveWriter
+from utils.climate_store import ClimateSeries
+from utils.services import quantize_coordinates
+
+
+class NoCache(ResponseCache):
+    """The series are written to the archive, caching the raw responses would only fill the disk"""
+
+    async def get(self, key: str) -> dict | None:
+        return self.count(None)
+
+    async def set(self, key: str, value: dict, ttl: int) -> None:
+        pass
+
+
+async def ingest(
+    locations: list[dict[str, float]], units: str, concurrency: int
+) -> tuple[int, int]:
+    """Fetch the climate series of the locations and write them into a new archive
+
+    Args:
+        locations: latitude and longitude of the tracked locations
+        units: units of measurement, can be metric or imperial
+        concurrency: number of concurrent calls to the climate API
+
+    Returns:
+        tuple[int, int]: number of locations written and skipped
+    """
+    api = OpenMeteoAPI(client=UpstreamClient(cache=NoCache()))
+    params = api.climate_params(units)
+    coordinates = [
+        quantize_coordinates(
+            {"latitude": location["lat"], "longitude": location["lon"]},
+            ("latitude", "longitude"),
+        )
+        for location in locations
+    ]
+    writer = ClimateArchiveWriter(
+        ClimateArchive(),
+        params,
+        [(location["latitude"], location["longitude"]) for location in coordinates],
+    )
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(row: int, location: dict[str, float]) -> bool:
+        async with semaphore:
+            try:
+                response = await api.get_api_response("climate", params, location)
+            except Exception as e:
+                sentry_sdk.capture_exception(e)
+                return False
+        return writer.add(row, ClimateSeries.from_response(response))
+
+    try:
+        written = await asyncio.gather(
+            *[fetch(row, location) for row, location in enumerate(coordinates)]
+        )
+    finally:
+        await api.client.close()
+    writer.publish()
+    return sum(written), len(written) - sum(written)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("locations", help="JSON file with the tracked locations")
+    parser.add_argument("--units", default="metric", choices=["metric", "imperial"])
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    with open(args.locations) as f:
+        locations = json.load(f)
+    written, skipped = asyncio.run(ingest(locations, args.units, args.concurrency))
+    print(f"Archived {written} locations, skipped {skipped}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+import jwt
+import sentry_sdk
+from config.upstream import client as upstream_client
+from cryptography.x509 import load_pem_x509_certificate
+from fastapi import HTTPException
+from services.http_client import UpstreamClient
+from utils.concurrency import SingleFlight
+
+GOOGLE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+
+
+class KeySource:
+    """Interface of the sources of public keys for verifying Firebase ID tokens"""
+
+    async def get_keys(self, refresh: bool = False) -> dict[str, Any]:
+        """Get the public keys by their key id
+
+        Args:
+            refresh: fetch the keys again, e.g. when a token is signed with an unknown key
+
+        Returns:
+            dict[str, Any]: public keys by their key id
+        """
+        raise NotImplementedError
+
+
+@dataclass
+class StaticKeySource(KeySource):
+    """Fixed set of public keys, e.g. for tests with local keys"""
+
+    keys: dict[str, Any]
+
+    async def get_keys(self, refresh: bool = False) -> dict[str, Any]:
+        return self.keys
+
+
+@dataclass
+class GoogleCertSource(KeySource):
+    """Public certificates Google signs Firebase ID tokens with, cached as long as their Cache-Control allows
+
+    If they cannot be fetched again, the keys already fetched are kept and the next attempt
+    waits for min_refresh_interval.
+    """
+
+    url: str = GOOGLE_CERTS_URL
+    client: UpstreamClient = field(default_factory=lambda: upstream_client)
+    min_refresh_interval: int = 60
+    _keys: dict[str, Any] = field(default_factory=dict, init=False, repr=False)
+    _expires: float = field(default=0, init=False, repr=False)
+    _fetched: float = field(default=0, init=False, repr=False)
+    _flights: SingleFlight = field(default_factory=SingleFlight, init=False, repr=False)
+
+    async def get_keys(self, refresh: bool = False) -> dict[str, Any]:
+        now = time.time()
+        # Refreshing on unknown keys is rate limited, so forged key ids cannot flood Google
+        if now >= self._expires or (
+            refresh and now - self._fetched >= self.min_refresh_interval
+        ):
+            try:
+                await self._flights.do(self.url, self._fetch)
+            except HTTPException as e:
+                if not self._keys:
+                    raise
+                # The keys rotate slowly, most tokens are still signed with the ones we have
+                sentry_sdk.capture_exception(e)
+                self._fetched = now
+                self._expires = now + self.min_refresh_interval
+        return self._keys
+
+    async def _fetch(self) -> None:
+        response = await self.client.get(self.url)
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=502, detail="Could not fetch Firebase public keys"
+            )
+        max_age = re.search(r"max-age=(\d+)", response.headers.get("cache-control", ""))
+        self._keys = {
+            kid: load_pem_x509_certificate(cert.encode()).public_key()
+            for kid, cert in response.json().items()
+        }
+        self._fetched = time.time()
+        self._expires = self._fetched + (int(max_age.group(1)) if max_age else 0)
+
+
+@dataclass
+class TokenVerifier:
+    """Verifies Firebase ID tokens locally, without a round-trip to Firebase"""
+
+    project_id: str
+    keys: KeySource = field(default_factory=GoogleCertSource)
+    leeway: int = 10
+
+    async def verify(self, token: str) -> dict[str, Any]:
+        """Verify the signature and claims of a Firebase ID token
+
+        Args:
+            token: firebase JWT token
+
+        Raises:
+            HTTPException: if the token is invalid or expired
+
+        Returns:
+            dict[str, Any]: claims of the token, the user id is in "user_id"
+        """
+        try:
+            header = jwt.get_unverified_header(token)
+            keys = await self.keys.get_keys()
+            if header.get("kid") not in keys:
+                keys = await self.keys.get_keys(refresh=True)
+            claims = jwt.decode(
+                token,
+                keys[header["kid"]],
+                algorithms=["RS256"],
+                audience=self.project_id,
+                issuer=f"https://securetoken.google.com/{self.project_id}",
+                leeway=self.leeway,
+                options={"require": ["exp", "iat", "sub"]},
+            )
+        except (jwt.PyJWTError, KeyError):
+            raise HTTPException(
+                detail="Error in firebase: INVALID_ID_TOKEN", status_code=400
+            )
+        if not claims["sub"] or claims.get("auth_time", 0) > time.time() + self.leeway:
+            raise HTTPException(
+                detail="Error in firebase: INVALID_ID_TOKEN", status_code=400
+            )
+        claims["user_id"] = claims["sub"]
+        return claims
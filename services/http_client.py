@@ -0,0 +1,334 @@
+import asyncio
+import time
+from collections import Counter, OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+from urllib.parse import urlsplit
+
+import httpx
+import sentry_sdk
+from fastapi import HTTPException
+from utils.cache import ResponseCache, SQLiteCache
+from utils.concurrency import SingleFlight
+from utils.quota import quota_priority
+from utils.resilience import Bulkhead, CircuitBreaker
+from utils.services import normalize_url
+from utils.settings import (
+    CIRCUIT_BREAKERS,
+    DEFAULT_UPSTREAM_LIMITS,
+    FALLBACK_WINDOW,
+    PARSED_CACHE_SIZE,
+    UPSTREAM_BULKHEADS,
+    UPSTREAM_LIMITS,
+    UPSTREAM_TIMEOUT,
+)
+
+# When set to a list, get_json adds the time each successful response it returns stops being fresh
+upstream_expiries: ContextVar[list[float] | None] = ContextVar(
+    "upstream_expiries", default=None
+)
+
+
+def response_json(response: httpx.Response) -> Any:
+    """Decode the JSON body of an upstream response
+
+    Error responses of the upstream or of a proxy in front of it (e.g. a 502 HTML page)
+    may not be JSON, they are raised as a bad gateway so a kept response can be served.
+
+    Args:
+        response: response of the upstream API call
+
+    Raises:
+        HTTPException: if an error response has no JSON body
+
+    Returns:
+        Any: JSON body of the response
+    """
+    try:
+        return response.json()
+    except ValueError:
+        if response.status_code < 400:
+            raise
+        raise HTTPException(
+            status_code=502,
+            detail=f"{response.url.host} answered {response.status_code} without a JSON body",
+        )
+
+
+@dataclass
+class UpstreamClient:
+    """Async HTTP client keeping one keep-alive connection pool per upstream host"""
+
+    cache: ResponseCache = field(default_factory=SQLiteCache)
+    limits: dict[str, dict[str, float]] = field(default_factory=lambda: UPSTREAM_LIMITS)
+    timeout: dict[str, float] = field(default_factory=lambda: UPSTREAM_TIMEOUT)
+    transport: httpx.AsyncBaseTransport | None = None
+    parsed_size: int = PARSED_CACHE_SIZE
+    fallback: int = FALLBACK_WINDOW
+    breakers: dict[str, CircuitBreaker] = field(
+        default_factory=lambda: {
+            name: CircuitBreaker(name, **config)
+            for name, config in CIRCUIT_BREAKERS.items()
+        }
+    )
+    bulkheads: dict[str, Bulkhead] = field(
+        default_factory=lambda: {
+            name: Bulkhead(name, **config)
+            for name, config in UPSTREAM_BULKHEADS.items()
+        }
+    )
+    _clients: dict[str, httpx.AsyncClient] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    _flights: SingleFlight = field(default_factory=SingleFlight, init=False, repr=False)
+    _refreshes: set[asyncio.Task] = field(default_factory=set, init=False, repr=False)
+    _hot: Counter = field(default_factory=Counter, init=False, repr=False)
+    _hot_calls: dict[str, tuple] = field(default_factory=dict, init=False, repr=False)
+    _parsed: OrderedDict = field(default_factory=OrderedDict, init=False, repr=False)
+
+    def pool(self, host: str) -> httpx.AsyncClient:
+        """Get the connection pool for an upstream host, creating it on first use
+
+        Args:
+            host: hostname of the upstream API
+
+        Returns:
+            httpx.AsyncClient: client holding the pool for the host
+        """
+        if host not in self._clients:
+            self._clients[host] = httpx.AsyncClient(
+                limits=httpx.Limits(**self.limits.get(host, DEFAULT_UPSTREAM_LIMITS)),
+                timeout=httpx.Timeout(**self.timeout),
+                transport=self.transport,
+            )
+        return self._clients[host]
+
+    async def get(self, url: str) -> httpx.Response:
+        """Send a GET request through the pool of the upstream host
+
+        Args:
+            url: URL of the upstream API call
+
+        Raises:
+            HTTPException: If the upstream API times out or cannot be reached
+
+        Returns:
+            httpx.Response: Response from the upstream API
+        """
+        try:
+            return await self.pool(urlsplit(url).hostname).get(url)
+        except httpx.TimeoutException:
+            raise HTTPException(status_code=504, detail="Upstream API timed out")
+        except httpx.TransportError:
+            raise HTTPException(status_code=502, detail="Upstream API is unreachable")
+
+    async def get_json(
+        self,
+        url: str,
+        ttl: int,
+        stale: int = 0,
+        parse: Callable[[dict], Any] | None = None,
+        upstream: str | None = None,
+        load: Callable[[], Awaitable[tuple[int, Any]]] | None = None,
+    ) -> tuple[int, Any]:
+        """Get the JSON body of an upstream API call, successful responses are cached
+
+        Concurrent calls for the same normalized URL share one upstream request. Once a
+        response expires it can still be served for the stale window, while it is
+        refreshed in the background. Requests to a named upstream go through its
+        bulkhead and circuit breaker, while it is open only cached responses are served.
+        Responses are kept for the fallback window after the stale window, and served
+        when the upstream cannot be called (e.g. open breaker, exhausted quota).
+
+        Args:
+            url: URL of the upstream API call
+            ttl: how long (in seconds) the response is fresh
+            stale: how long (in seconds) after it expires the response can still be served
+            parse: parses successful responses, the result is kept in memory and reused
+                until the response changes, so it must not be mutated
+            upstream: name of the upstream, for its bulkhead and circuit breaker
+            load: loads the status code and JSON body on a miss instead of requesting
+                the URL (e.g. as part of a batched request), the URL stays the cache key
+
+        Raises:
+            HTTPException: If the upstream cannot be called and no response is kept
+
+        Returns:
+            tuple[int, Any]: status code and JSON body of the response, parsed if successful
+        """
+        key = normalize_url(url)
+        self._hot[key] += 1
+        self._hot_calls[key] = (url, ttl, stale, upstream, load)
+        parsed = self._parsed.get((key, parse)) if parse is not None else None
+        if parsed is not None and time.time() - parsed[0] < ttl:
+            self._parsed.move_to_end((key, parse))
+            self._expires(parsed[0] + ttl)
+            return 200, parsed[1]
+        entry = await self.cache.get(key)
+        age = time.time() - entry["fetched_at"] if entry is not None else None
+        if age is not None and age < ttl + stale:
+            if age >= ttl:
+                self.refresh(url, key, ttl, stale, upstream, load)
+            status_code = 200
+        else:
+            try:
+                status_code, fetched = await self._flights.do(
+                    key, lambda: self._fetch(url, key, ttl, stale, upstream, load)
+                )
+            except HTTPException as e:
+                # Fall back to the last response, client errors are not about the upstream
+                if entry is None or e.status_code < 500:
+                    raise
+                status_code = 200
+            else:
+                if entry is None or (status_code != 429 and status_code < 500):
+                    entry = fetched
+                else:
+                    # The upstream is rate limiting or failing, serve the last response
+                    status_code = 200
+        if status_code == 200:
+            self._expires(entry["fetched_at"] + ttl)
+        if parse is None or status_code != 200:
+            return status_code, entry["data"]
+        return 200, self._parse(key, entry, parse)
+
+    def refresh(
+        self,
+        url: str,
+        key: str,
+        ttl: int,
+        stale: int,
+        upstream: str | None = None,
+        load: Callable[[], Awaitable[tuple[int, Any]]] | None = None,
+    ) -> None:
+        """Refresh a cached response in the background
+
+        Args:
+            url: URL of the upstream API call
+            key: cache key of the response
+            ttl: how long (in seconds) the response is fresh
+            stale: how long (in seconds) after it expires the response can still be served
+            upstream: name of the upstream, for its bulkhead and circuit breaker
+            load: loads the status code and JSON body instead of requesting the URL
+        """
+
+        async def background() -> tuple[int, dict]:
+            # Refreshes only get the upstream quota the requests leave
+            quota_priority.set("background")
+            return await self._flights.do(
+                key, lambda: self._fetch(url, key, ttl, stale, upstream, load)
+            )
+
+        task = asyncio.ensure_future(background())
+        self._refreshes.add(task)
+        task.add_done_callback(self._refreshed)
+
+    async def refresh_hot(self, top_k: int, interval: int) -> None:
+        """Keep refreshing the most requested responses before they expire, runs until cancelled
+
+        A pass that fails is reported and skipped, the loop keeps going.
+
+        Args:
+            top_k: number of the most requested responses to keep fresh
+            interval: how often (in seconds) the most requested responses are checked
+        """
+        while True:
+            await asyncio.sleep(interval)
+            hot, self._hot = self._hot, Counter()
+            calls, self._hot_calls = self._hot_calls, {}
+            try:
+                for key, _ in hot.most_common(top_k):
+                    url, ttl, stale, upstream, load = calls[key]
+                    entry = await self.cache.get(key)
+                    # Refresh the responses that would expire before the next check
+                    if (
+                        entry is None
+                        or time.time() - entry["fetched_at"] >= ttl - interval
+                    ):
+                        self.refresh(url, key, ttl, stale, upstream, load)
+            except Exception as e:
+                # e.g. the cache is unreachable for a moment, the next pass tries again
+                sentry_sdk.capture_exception(e)
+
+    def stats(self) -> dict[str, dict[str, float | str]]:
+        """Get the state of the circuit breaker and bulkhead of each upstream
+
+        Returns:
+            dict[str, dict[str, float | str]]: breaker state, failure rate and calls in flight of each upstream
+        """
+        return {
+            name: {**breaker.stats(), **self.bulkheads[name].stats()}
+            for name, breaker in self.breakers.items()
+        }
+
+    async def request(self, url: str, upstream: str | None = None) -> httpx.Response:
+        """Send a GET request, through the bulkhead and circuit breaker of a named upstream
+
+        Args:
+            url: URL of the upstream API call
+            upstream: name of the upstream, for its bulkhead and circuit breaker
+
+        Raises:
+            HTTPException: If the upstream is busy, its circuit breaker is open, or it
+                times out or cannot be reached
+
+        Returns:
+            httpx.Response: Response from the upstream API
+        """
+        if upstream is None:
+            return await self.get(url)
+        # Server errors count against the upstream, client errors (e.g. unknown city) do not
+        return await self.bulkheads[upstream].run(
+            lambda: self.breakers[upstream].call(
+                lambda: self.get(url),
+                failed=lambda response: response.status_code >= 500,
+            )
+        )
+
+    async def _fetch(
+        self,
+        url: str,
+        key: str,
+        ttl: int,
+        stale: int,
+        upstream: str | None = None,
+        load: Callable[[], Awaitable[tuple[int, Any]]] | None = None,
+    ) -> tuple[int, dict]:
+        if load is None:
+            response = await self.request(url, upstream)
+            status_code, data = response.status_code, response_json(response)
+        else:
+            status_code, data = await load()
+        entry = {"fetched_at": time.time(), "data": data}
+        if status_code == 200:
+            await self.cache.set(key, entry, ttl + stale + self.fallback)
+        return status_code, entry
+
+    def _parse(self, key: str, entry: dict, parse: Callable[[dict], Any]) -> Any:
+        parsed = self._parsed.get((key, parse))
+        if parsed is None or parsed[0] != entry["fetched_at"]:
+            parsed = (entry["fetched_at"], parse(entry["data"]))
+        self._parsed[(key, parse)] = parsed
+        self._parsed.move_to_end((key, parse))
+        if len(self._parsed) > self.parsed_size:
+            self._parsed.popitem(last=False)
+        return parsed[1]
+
+    def _expires(self, expires: float) -> None:
+        expiries = upstream_expiries.get()
+        if expiries is not None:
+            expiries.append(expires)
+
+    def _refreshed(self, task: asyncio.Task) -> None:
+        self._refreshes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            sentry_sdk.capture_exception(task.exception())
+
+    async def close(self) -> None:
+        """Cancel the background refreshes and close all connection pools, called on app shutdown"""
+        for task in self._refreshes:
+            task.cancel()
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
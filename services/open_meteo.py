@@ -1,56 +1,201 @@
-from dataclasses import dataclass
+import asyncio
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Callable
 
-import requests
-import requests_cache
+from config.upstream import client as upstream_client
+from config.upstream import climate_archive, climate_store
 from fastapi import HTTPException
 from models.weather import AirQuality, ClimateStats
+from services.http_client import UpstreamClient, response_json
+from utils.climate_archive import ClimateArchive
+from utils.climate_store import ClimateSeries, ClimateStore
 from utils.parsers.open_meteo import OpenMeteoParser
-from utils.services import parse_query, units_appendix
+from utils.services import parse_query, quantize_coordinates, units_appendix
+from utils.settings import CACHE_TTL, OPEN_METEO_BATCH, STALE_WINDOW
+
+
+@dataclass
+class OpenMeteoBatcher:
+    """Collects the concurrent cache misses of the Open-Meteo APIs for a short window and
+    sends them as one multi-location request, the results are split back to each caller
+
+    Open-Meteo accepts comma-separated latitude and longitude lists and answers with a
+    list of results, one per location, in the same order. If the API rejects a batch,
+    e.g. because of one bad location, each of its locations is requested on its own.
+    """
+
+    client: UpstreamClient
+    window: float = OPEN_METEO_BATCH["window"]
+    max_size: int = OPEN_METEO_BATCH["max_size"]
+    batches: int = field(default=0, init=False)
+    locations: int = field(default=0, init=False)
+    _pending: dict[tuple[str, str], list[tuple[str, str, asyncio.Future]]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    _timers: dict[tuple[str, str], asyncio.TimerHandle] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    _sending: set[asyncio.Task] = field(default_factory=set, init=False, repr=False)
+
+    async def fetch(
+        self, type: str, params: str, latitude: str, longitude: str
+    ) -> tuple[int, Any]:
+        """Fetch the response of one location as part of the next batch
+
+        Args:
+            type: Type of API call, air-quality or climate
+            params: params of the API call, apart from the location
+            latitude: latitude, as sent to the API
+            longitude: longitude, as sent to the API
+
+        Raises:
+            HTTPException: If the batched request fails
+
+        Returns:
+            tuple[int, Any]: status code and JSON body of the response for the location
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not (-90 <= float(latitude) <= 90 and -180 <= float(longitude) <= 180):
+            # Out of range coordinates would fail the whole batch, they get their own request
+            self._start(type, params, [(latitude, longitude, future)])
+            return await future
+        group = (type, params)
+        batch = self._pending.setdefault(group, [])
+        batch.append((latitude, longitude, future))
+        if len(batch) >= self.max_size:
+            self._flush(group)
+        elif len(batch) == 1:
+            self._timers[group] = loop.call_later(self.window, self._flush, group)
+        return await future
+
+    def _flush(self, group: tuple[str, str]) -> None:
+        timer = self._timers.pop(group, None)
+        if timer is not None:
+            timer.cancel()
+        batch = [item for item in self._pending.pop(group, []) if not item[2].done()]
+        if batch:
+            self._start(*group, batch)
+
+    def _start(
+        self, type: str, params: str, batch: list[tuple[str, str, asyncio.Future]]
+    ) -> None:
+        task = asyncio.ensure_future(self._send(type, params, batch))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def _send(
+        self,
+        type: str,
+        params: str,
+        batch: list[tuple[str, str, asyncio.Future]],
+    ) -> None:
+        latitudes = ",".join(latitude for latitude, _, _ in batch)
+        longitudes = ",".join(longitude for _, longitude, _ in batch)
+        url = f"https://{type}-api.open-meteo.com/v1/{type}?latitude={latitudes}&longitude={longitudes}&{params}"
+        self.batches += 1
+        self.locations += len(batch)
+        try:
+            response = await self.client.request(url, type)
+            data = response_json(response)
+        except asyncio.CancelledError:
+            for *_, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        if len(batch) == 1:
+            # A single location is answered with an object
+            if not batch[0][2].done():
+                batch[0][2].set_result((response.status_code, data))
+            return
+        if (
+            response.status_code != 200
+            or not isinstance(data, list)
+            or len(data) != len(batch)
+        ):
+            # The error or the results cannot be told apart by location, retry them one by one
+            for item in batch:
+                if not item[2].done():
+                    self._start(type, params, [item])
+            return
+        for (*_, future), result in zip(batch, data):
+            if not future.done():
+                future.set_result((200, result))
 
 
 @dataclass
 class OpenMeteoAPI:
     AIR_QUALITY_URL = "https://air-quality-api.open-meteo.com/v1/air-quality?"
     CLIMATE_URL = "https://climate-api.open-meteo.com/v1/climate?"
+    CLIMATE_MODEL = "EC_Earth3P_HR"
+    client: UpstreamClient = field(default_factory=lambda: upstream_client)
+    store: ClimateStore = field(default_factory=lambda: climate_store)
+    archive: ClimateArchive = field(default_factory=lambda: climate_archive)
+    batcher: OpenMeteoBatcher | None = None
     parser = OpenMeteoParser()
 
-    def get_api_response(
+    def __post_init__(self):
+        if self.batcher is None:
+            self.batcher = OpenMeteoBatcher(self.client)
+
+    async def get_api_response(
         self,
         type: str,
         additional_params: str,
         query_params: dict[str, float | str],
         units: str = "",
-    ) -> dict:
+        parse: Callable[[dict], Any] | None = None,
+    ) -> Any:
         """Get response from OpenWeatherMap API
 
+        Cache misses of concurrent calls are fetched together, see OpenMeteoBatcher.
+
         Args:
             type: Type of API call
             query_params: Query params for the API call
             additional_params: Additional params for the API call
             units: Units of measurement for the API call
+            parse: Parses the response, the parsed response is reused until it changes
 
         Returns:
-            dict: Response from OpenWeatherMap API
+            Any: Response from OpenWeatherMap API, parsed if parse is given
 
         Raises:
             HTTPException: If the API call returns an error, propage the error to the client
         """
-        query_params = parse_query(query_params)
+        location = quantize_coordinates(query_params, ("latitude", "longitude"))
+        query_params = parse_query(location)
         url = f"https://{type}-api.open-meteo.com/v1/{type}?{query_params}&{additional_params}{units}"
-        cache_expire_after = 3600 if type == "air-quality" else 86400
-        session = requests_cache.CachedSession(
-            "demo_cache", expire_after=cache_expire_after
+        load = None
+        if set(location) == {"latitude", "longitude"}:
+            # Only plain locations can be batched, their params are shared by the batch
+            load = lambda: self.batcher.fetch(
+                type,
+                f"{additional_params}{units}",
+                str(location["latitude"]),
+                str(location["longitude"]),
+            )
+        status_code, data = await self.client.get_json(
+            url,
+            CACHE_TTL[type],
+            STALE_WINDOW[type],
+            parse,
+            upstream=type,
+            load=load,
         )
-        response = session.get(url)
-        data = response.json()
-        if "error" in data and data["error"] == True:
+        if status_code != 200 and "error" in data and data["error"] == True:
             raise HTTPException(
-                status_code=response.status_code,
+                status_code=status_code,
                 detail="Could not fetch data from OpenMeteo API",
             )
         return data
 
-    def get_air_quality(self, query_params: dict[str, float | str]) -> AirQuality:
+    async def get_air_quality(self, query_params: dict[str, float | str]) -> AirQuality:
         """Get the air quality for a location (latitude, longitude)
 
         Args:
@@ -62,14 +207,14 @@ class OpenMeteoAPI:
         Returns:
             AirQuality: air quality data for the location according to European AQI
         """
-        response = self.get_api_response(
+        return await self.get_api_response(
             "air-quality",
             "hourly=european_aqi,european_aqi_pm2_5,european_aqi_pm10,european_aqi_no2,european_aqi_o3,european_aqi_so2",
             query_params,
+            parse=self.parser.air_quality,
         )
-        return self.parser.air_quality(response)
 
-    def get_historical_data(
+    async def get_historical_data(
         self,
         query_params: dict[str, float | str],
         start: str = "2000-01-01",
@@ -77,6 +222,9 @@ class OpenMeteoAPI:
     ) -> ClimateStats:
         """Gets the historical data for a same day in a given range of years and location (latitude, longitude)
 
+        Tracked locations are read from the climate archive, the whole daily series of other
+        locations is only fetched once and later days are read from the climate store.
+
         Args:
             query_params: the location (latitude, longitude) for the API call, along with the units of measurement
             start: Defaults to "2000-01-01".
@@ -88,11 +236,51 @@ class OpenMeteoAPI:
         Returns:
             ClimateStats: historical data for the location
         """
-        units = units_appendix(query_params.pop("units"))
-        response = self.get_api_response(
-            "climate",
-            f"start_date={start}&end_date={end}&models=EC_Earth3P_HR&daily=temperature_2m_mean,windspeed_10m_mean,relative_humidity_2m_mean,precipitation_sum,cloudcover_mean,pressure_msl_mean",
-            query_params,
-            units,
+        params = self.climate_params(query_params.pop("units"), start, end)
+        location = quantize_coordinates(query_params, ("latitude", "longitude"))
+        today = date.today()
+        climate = self.archive.same_day(
+            location["latitude"], location["longitude"], params, today
         )
-        return self.parser.historical_data(response)
+        if climate is None:
+            series = await self.get_climate_series(location, params)
+            climate = series.same_day(today)
+        return self.parser.climate_stats(*climate)
+
+    async def get_climate_series(
+        self, query_params: dict[str, float | str], params: str
+    ) -> ClimateSeries:
+        """Get the whole daily climate series of a location, from the climate store or the API
+
+        Args:
+            query_params: the location (latitude, longitude) for the API call
+            params: params of the climate API call, see climate_params
+
+        Raises:
+            HTTPException: API returns an error
+
+        Returns:
+            ClimateSeries: daily climate series of the location
+        """
+        key = f"{parse_query(query_params)}&{params}"
+        series = self.store.get(key)
+        if series is None:
+            response = await self.get_api_response("climate", params, query_params)
+            series = ClimateSeries.from_response(response)
+            self.store.save(key, series)
+        return series
+
+    def climate_params(
+        self, units: str, start: str = "2000-01-01", end: str = "2025-12-31"
+    ) -> str:
+        """Get the params of the climate API call, apart from the location
+
+        Args:
+            units: units of measurement, can be metric or imperial
+            start: Defaults to "2000-01-01".
+            end: Defaults to "2025-12-31".
+
+        Returns:
+            str: params of the climate API call
+        """
+        return f"start_date={start}&end_date={end}&models={self.CLIMATE_MODEL}&daily=temperature_2m_mean,windspeed_10m_mean,relative_humidity_2m_mean,precipitation_sum,cloudcover_mean,pressure_msl_mean{units_appendix(units)}"
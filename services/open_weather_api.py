@@ -1,13 +1,18 @@
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Any, Callable
 
-import requests
-import requests_cache
+from config.upstream import client as upstream_client
+from config.upstream import open_weather_quota
 from dotenv import load_dotenv
 from fastapi import HTTPException
-from models.weather import CurrentWeather, Forecast
+from models.compact import CompactForecast
+from models.weather import CurrentWeather
+from services.http_client import UpstreamClient, response_json
 from utils.parsers.open_weather import OpenWeatherParser
-from utils.services import parse_query
+from utils.quota import QuotaScheduler
+from utils.services import parse_query, quantize_coordinates
+from utils.settings import CACHE_TTL, STALE_WINDOW
 
 load_dotenv()
 
@@ -17,9 +22,11 @@ class OpenWeatherAPI:
     """Fetches weather data from OpenWeatherMap API"""
 
     api_key: str = os.getenv("OPEN_WEATHER_API_KEY")
+    client: UpstreamClient = field(default_factory=lambda: upstream_client)
+    quota: QuotaScheduler = field(default_factory=lambda: open_weather_quota)
     parser = OpenWeatherParser()
 
-    def get_weather(self, query_params: dict[str, float | str]) -> CurrentWeather:
+    async def get_weather(self, query_params: dict[str, float | str]) -> CurrentWeather:
         """Get current weather data for a city
 
         Args:
@@ -28,43 +35,78 @@ class OpenWeatherAPI:
         Returns:
             CurrentWeather: Current weather data for the city
         """
-        response = self.get_api_response("weather", query_params)
-        return self.parser.current_weather(response)
+        return await self.get_api_response(
+            "weather", query_params, self.parser.current_weather
+        )
 
-    def get_forecast(self, query_params: dict[str, float | str]) -> Forecast:
+    async def get_forecast(
+        self, query_params: dict[str, float | str]
+    ) -> CompactForecast:
         """Get forecast data for a city
 
         Args:
             query_params: Query params for the API call
 
         Returns:
-            Forecast: 5 day forecast data for the city (in 3 hour intervals)
+            CompactForecast: 5 day forecast data for the city (in 3 hour intervals), use to_model for the Forecast model
         """
-        response = self.get_api_response("forecast", query_params)
-        return self.parser.forecast(response)
+        return await self.get_api_response(
+            "forecast", query_params, self.parser.compact_forecast
+        )
 
-    def get_api_response(self, type: str, query_params: dict[str, float | str]) -> dict:
+    async def get_api_response(
+        self,
+        type: str,
+        query_params: dict[str, float | str],
+        parse: Callable[[dict], Any] | None = None,
+    ) -> Any:
         """Get response from OpenWeatherMap API
 
+        Cache misses wait for a token of the quota of the plan, in the order of the
+        priority of the request. Calls that cannot get one are served the last cached
+        response, if there is one.
+
         Args:
             type: Type of API call
             query_params: Query params for the API call
+            parse: Parses the response, the parsed response is reused until it changes
 
         Returns:
-            dict: Response from OpenWeatherMap API
+            Any: Response from OpenWeatherMap API, parsed if parse is given
 
         Raises:
             HTTPException: If the API call returns an error, propage the error to the client
         """
-        query_params = parse_query(query_params)
+        query_params = parse_query(quantize_coordinates(query_params))
         url = f"https://api.openweathermap.org/data/2.5/{type}?appid={self.api_key}&{query_params}"
-        cache_expire_after = 3600 if type == "forecast" else 600
-        session = requests_cache.CachedSession(
-            "demo_cache", expire_after=cache_expire_after
+        status_code, response = await self.client.get_json(
+            url,
+            CACHE_TTL[type],
+            STALE_WINDOW[type],
+            parse,
+            upstream=type,
+            load=lambda: self.fetch(url, type),
         )
-        response = session.get(url).json()
-        if int(response["cod"]) >= 400 and int(response["cod"]) < 600:
+        if status_code != 200 and 400 <= int(response["cod"]) < 600:
             raise HTTPException(
                 status_code=int(response["cod"]), detail=response["message"]
             )
         return response
+
+    async def fetch(self, url: str, type: str) -> tuple[int, Any]:
+        """Call the OpenWeatherMap API once a token of the quota is available
+
+        Args:
+            url: URL of the API call
+            type: Type of API call
+
+        Raises:
+            HTTPException: If no token is available in time, the API cannot be reached, or
+                it answers an error without a JSON body
+
+        Returns:
+            tuple[int, Any]: status code and JSON body of the response
+        """
+        await self.quota.acquire()
+        response = await self.client.request(url, type)
+        return response.status_code, response_json(response)
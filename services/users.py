@@ -0,0 +1,127 @@
+import hashlib
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+import jwt
+from services.firebase_tokens import TokenVerifier
+from utils.cache import ResponseCache, SQLiteCache
+from utils.concurrency import BlockingPool
+from utils.settings import TIER_CACHE_TTL
+
+
+def token_ttl(token: str) -> int:
+    """Get the number of seconds until a Firebase JWT token expires
+
+    Args:
+        token: firebase JWT token, the signature is not checked
+
+    Returns:
+        int: seconds until the token expires, 0 if it is expired or malformed
+    """
+    try:
+        expires = jwt.decode(token, options={"verify_signature": False})["exp"]
+    except (jwt.PyJWTError, KeyError):
+        return 0
+    return max(int(expires - time.time()), 0)
+
+
+@dataclass
+class UserService:
+    """Looks up users and their tiers in Firebase, caching the results
+
+    A token maps to its user for as long as the token is valid. Tiers are cached per user
+    and invalidated whenever the tier is written. Tokens are verified locally when a
+    verifier is given, otherwise through Firebase. The blocking Pyrebase calls run in the pool.
+    """
+
+    auth: Any
+    db: Any
+    store: ResponseCache = field(default_factory=SQLiteCache)
+    verifier: TokenVerifier | None = None
+    tier_ttl: int = TIER_CACHE_TTL
+    pool: BlockingPool = field(default_factory=lambda: BlockingPool("firebase"))
+
+    async def verify(self, token: str) -> dict[str, Any]:
+        """Verify a token and get the user it belongs to
+
+        Args:
+            token: firebase JWT token
+
+        Raises:
+            HTTPException: if the token is invalid (local verification), or Firebase is overloaded or times out
+            HTTPError: if the token is invalid (verification through Firebase)
+
+        Returns:
+            dict[str, Any]: claims of the token, including the user id ("user_id") and display name ("name")
+        """
+        if self.verifier is not None:
+            return await self.verifier.verify(token)
+        user = (await self.pool.run(self.auth.get_account_info, token))["users"][0]
+        return {"user_id": user["localId"], "name": user.get("displayName")}
+
+    async def get_uid(self, token: str) -> str:
+        """Get the id of the user a token belongs to
+
+        Args:
+            token: firebase JWT token
+
+        Raises:
+            HTTPException: if the token is invalid (local verification)
+            HTTPError: if the token is invalid (verification through Firebase)
+
+        Returns:
+            str: firebase user id
+        """
+        cached = await self.store.get(self._token_key(token))
+        if cached is not None:
+            return cached["uid"]
+        uid = (await self.verify(token))["user_id"]
+        await self._remember_token(token, uid)
+        return uid
+
+    async def get_tier(self, uid: str) -> str:
+        """Get the tier of a user
+
+        Args:
+            uid: firebase user id
+
+        Returns:
+            str: free or paid
+        """
+        cached = await self.store.get(f"user:tier:{uid}")
+        if cached is not None:
+            return cached["tier"]
+        tier = await self.pool.run(
+            lambda: self.db.child("users").child(uid).get().val()["tier"]
+        )
+        await self.store.set(f"user:tier:{uid}", {"tier": tier}, self.tier_ttl)
+        return tier
+
+    async def remember(self, token: str, uid: str, tier: str) -> None:
+        """Cache a user that was just looked up, e.g. on login
+
+        Args:
+            token: firebase JWT token
+            uid: firebase user id
+            tier: free or paid
+        """
+        await self._remember_token(token, uid)
+        await self.store.set(f"user:tier:{uid}", {"tier": tier}, self.tier_ttl)
+
+    async def invalidate(self, uid: str) -> None:
+        """Forget the cached tier of a user, called whenever the tier is written
+
+        Args:
+            uid: firebase user id
+        """
+        await self.store.delete(f"user:tier:{uid}")
+
+    async def _remember_token(self, token: str, uid: str) -> None:
+        ttl = token_ttl(token)
+        if ttl > 0:
+            await self.store.set(self._token_key(token), {"uid": uid}, ttl)
+
+    @staticmethod
+    def _token_key(token: str) -> str:
+        return f"user:token:{hashlib.sha256(token.encode()).hexdigest()}"
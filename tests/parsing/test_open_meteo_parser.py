@@ -1,6 +1,7 @@
 import unittest
 from datetime import date
 
+import numpy as np
 from models.weather import AirQuality, ClimateStats
 from services.open_meteo import OpenMeteoParser
 
@@ -52,12 +53,36 @@ class TestOpenMeteoParser(unittest.TestCase):
 
         self.assertDictEqual(climate_stats.climate[0], expected_climate)
 
+    def test_historical_summary(self):
+        climate_stats = self.parser.historical_data(self.mocked_climate_response)
+
+        self.assertEqual(
+            climate_stats.summary["temp"],
+            {"mean": 5.0, "p10": 5.0, "median": 5.0, "p90": 5.0, "trend": 0.0},
+        )
+
+    def test_historical_trend(self):
+        years = np.array([2000, 2001, 2002, 2003])
+        values = np.array([1.0, np.nan, 3.0, 4.0])
+
+        self.assertAlmostEqual(self.parser.trend(years, values), 1.0)
+
     def test_parse_air_quality(self):
         air_quality = self.parser.air_quality(self.mocked_AQI_response)
 
         self.assertIsInstance(air_quality, AirQuality)
         self.assertEqual(air_quality.aqi[self.today], [7, 12, 70, 1, 1, 5])
 
+    def test_air_quality_summary(self):
+        air_quality = self.parser.air_quality(
+            self.mocked_AQI_response, mean=True, percentiles=(50,)
+        )
+
+        self.assertEqual(air_quality.mean[self.today], [6, 11, 60, 1 / 3, 1 / 3, 4])
+        self.assertEqual(
+            air_quality.percentiles["p50"][self.today], [6, 11, 60, 0, 0, 4]
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,3 +1,4 @@
+import json
 import unittest
 
 from models.weather import CurrentWeather, Forecast, ThreeHourWeather
@@ -143,6 +144,16 @@ class TestOpenWeatherParser(unittest.TestCase):
 
         self.assertEqual(forecast.forecasts[0], expected_forecast)
 
+    def test_compact_forecast(self):
+        forecast = self.parser.forecast(self.mocked_forecast_response)
+        compact = self.parser.compact_forecast(self.mocked_forecast_response)
+
+        self.assertEqual(compact.to_model(), forecast)
+        self.assertEqual(
+            json.loads(compact.copy(update={"lat": 51.5}).json_bytes()),
+            json.loads(forecast.copy(update={"lat": 51.5}).json_bytes()),
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,10 @@
+def test_metrics(test_app, additional_params):
+    response = test_app.get("/metrics", **additional_params)
+    assert response.status_code == 200
+    assert set(response.json()) == {"cache", "responses", "upstreams", "quota", "pools"}
+
+
+def test_metrics_other_host(test_app):
+    # The other trusted hosts pass the middleware, but must not see the metrics
+    response = test_app.get("/metrics", headers={"Host": "192.168.50.47"})
+    assert response.status_code == 404
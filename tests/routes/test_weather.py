@@ -1,3 +1,5 @@
+import json
+
 from app import app
 from fastapi.testclient import TestClient
 
@@ -44,6 +46,23 @@ def test_weather_by_coordinates(test_app, additional_params, auth_client, paid_c
     )
 
 
+def test_weather_streamed(test_app, additional_params, paid_client):
+    response = test_app.post(
+        "/weather/coordinates?lat=51.5074&lon=0.1278",
+        json={"token": paid_client["idToken"]},
+        headers={**additional_params["headers"], "Accept": "application/x-ndjson"},
+        cookies=additional_params["cookies"],
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+
+    sections = [json.loads(line)["section"] for line in response.text.splitlines()]
+    assert sections[0] in ("weather", "forecast")
+    assert {"weather", "forecast", "units", "air_quality", "historical"} <= set(
+        sections
+    )
+
+
 def test_weather_anonymous(test_app, additional_params):
     _test_weather(
         test_app, additional_params, {"idToken": "empty"}, "/weather/city?city=London"
@@ -68,3 +87,28 @@ def test_weather_openweather_exception(test_app, additional_params):
     )
     assert response.status_code == 404
     assert response.json() == {"message": "city not found"}
+
+
+def test_weather_batch(test_app, additional_params, auth_client):
+    response = test_app.post(
+        "/weather/batch",
+        json={
+            "token": auth_client["idToken"],
+            "locations": [
+                {"city": "London"},
+                {"lat": 51.5074, "lon": 0.1278},
+                {"city": "London"},
+                {"city": "wadsdasdawda"},
+            ],
+        },
+        **additional_params,
+    )
+    assert response.status_code == 200
+
+    lines = {
+        line["index"]: line for line in map(json.loads, response.text.splitlines())
+    }
+    assert sorted(lines) == [0, 1, 2, 3]
+    assert lines[0]["data"] == lines[2]["data"]
+    assert "forecast" in lines[1]["data"]
+    assert lines[3] == {"index": 3, "status": 404, "message": "city not found"}
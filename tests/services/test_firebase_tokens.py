@@ -0,0 +1,139 @@
+import time
+import unittest
+from datetime import datetime, timedelta
+
+import httpx
+import jwt
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from fastapi import HTTPException
+from services.firebase_tokens import GoogleCertSource, StaticKeySource, TokenVerifier
+from services.http_client import UpstreamClient
+
+PROJECT_ID = "weather-test"
+
+
+def make_token(private_key, kid="key", **claims):
+    now = int(time.time())
+    payload = {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}",
+        "aud": PROJECT_ID,
+        "sub": "uid",
+        "iat": now,
+        "auth_time": now,
+        "exp": now + 3600,
+        "name": "Test Name",
+        **claims,
+    }
+    return jwt.encode(payload, private_key, algorithm="RS256", headers={"kid": kid})
+
+
+class TestTokenVerifier(unittest.IsolatedAsyncioTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        cls.verifier = TokenVerifier(
+            project_id=PROJECT_ID,
+            keys=StaticKeySource({"key": cls.private_key.public_key()}),
+        )
+
+    async def test_verify(self):
+        claims = await self.verifier.verify(make_token(self.private_key))
+
+        self.assertEqual(claims["user_id"], "uid")
+        self.assertEqual(claims["name"], "Test Name")
+
+    async def test_invalid_tokens(self):
+        other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        tokens = [
+            "invalid_jwt_token_here",
+            make_token(self.private_key, exp=int(time.time()) - 60),
+            make_token(self.private_key, aud="other-project"),
+            make_token(self.private_key, iss="https://example.com"),
+            make_token(self.private_key, sub=""),
+            make_token(self.private_key, kid="unknown"),
+            make_token(other_key),
+        ]
+
+        for token in tokens:
+            with self.assertRaises(HTTPException) as cm:
+                await self.verifier.verify(token)
+
+            self.assertEqual(cm.exception.status_code, 400)
+            self.assertEqual(cm.exception.detail, "Error in firebase: INVALID_ID_TOKEN")
+
+
+class TestGoogleCertSource(unittest.IsolatedAsyncioTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "securetoken")])
+        cls.cert = (
+            x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(cls.private_key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(datetime.utcnow())
+            .not_valid_after(datetime.utcnow() + timedelta(days=1))
+            .sign(cls.private_key, hashes.SHA256())
+        )
+
+    def setUp(self):
+        self.calls = []
+        self.status_code = 200
+        self.max_age = 3600
+
+        def handler(request):
+            self.calls.append(request)
+            if self.status_code != 200:
+                return httpx.Response(self.status_code, text="Service Unavailable")
+            pem = self.cert.public_bytes(serialization.Encoding.PEM).decode()
+            return httpx.Response(
+                200,
+                json={"key": pem},
+                headers={
+                    "Cache-Control": f"public, max-age={self.max_age}, must-revalidate"
+                },
+            )
+
+        self.client = UpstreamClient(transport=httpx.MockTransport(handler))
+        self.verifier = TokenVerifier(
+            project_id=PROJECT_ID, keys=GoogleCertSource(client=self.client)
+        )
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def test_cached_by_max_age(self):
+        for _ in range(3):
+            claims = await self.verifier.verify(make_token(self.private_key))
+            self.assertEqual(claims["user_id"], "uid")
+
+        self.assertEqual(len(self.calls), 1)
+
+    async def test_refresh_fails(self):
+        self.max_age = 0
+        await self.verifier.verify(make_token(self.private_key))
+        self.status_code = 503
+
+        # The keys already fetched are kept, the next attempt waits for min_refresh_interval
+        for _ in range(3):
+            claims = await self.verifier.verify(make_token(self.private_key))
+            self.assertEqual(claims["user_id"], "uid")
+
+        self.assertEqual(len(self.calls), 2)
+
+    async def test_first_fetch_fails(self):
+        self.status_code = 503
+
+        with self.assertRaises(HTTPException) as cm:
+            await self.verifier.verify(make_token(self.private_key))
+
+        self.assertEqual(cm.exception.status_code, 502)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,177 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+import httpx
+from fastapi import HTTPException
+from services.http_client import UpstreamClient, upstream_expiries
+from utils.cache import SQLiteCache
+
+URL = "https://api.openweathermap.org/data/2.5/weather?appid=123&q=London"
+
+
+class TestUpstreamClient(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.calls = 0
+        self.status_code = 200
+
+        async def handler(request):
+            self.calls += 1
+            await asyncio.sleep(0.01)
+            return httpx.Response(self.status_code, json={"cod": self.calls})
+
+        self.client = UpstreamClient(
+            cache=SQLiteCache(":memory:"), transport=httpx.MockTransport(handler)
+        )
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.client.cache.close()
+
+    async def test_cached(self):
+        self.assertEqual(await self.client.get_json(URL, 600), (200, {"cod": 1}))
+        self.assertEqual(await self.client.get_json(URL, 600), (200, {"cod": 1}))
+        self.assertEqual(self.calls, 1)
+
+    async def test_parsed_once(self):
+        parsed = []
+
+        def parse(data):
+            parsed.append(data)
+            return {"parsed": data["cod"]}
+
+        first = await self.client.get_json(URL, 600, parse=parse)
+        second = await self.client.get_json(URL, 600, parse=parse)
+
+        self.assertEqual(first, (200, {"parsed": 1}))
+        self.assertIs(first[1], second[1])
+        self.assertEqual(len(parsed), 1)
+
+    async def test_expiries(self):
+        expiries = []
+        upstream_expiries.set(expiries)
+
+        await self.client.get_json(URL, 600)
+        await self.client.get_json(URL, 600)
+
+        self.assertEqual(len(expiries), 2)
+        self.assertAlmostEqual(expiries[0], time.time() + 600, delta=1)
+        self.assertEqual(expiries[0], expiries[1])
+
+    async def test_refresh_hot_keeps_running(self):
+        with mock.patch.object(self.client, "refresh") as refresh:
+            await self.client.get_json(URL, 0.01)
+            with mock.patch.object(
+                self.client.cache, "get", side_effect=ConnectionError("cache is down")
+            ):
+                refresher = asyncio.create_task(self.client.refresh_hot(1, 0.01))
+                await asyncio.sleep(0.03)
+
+            # The failed pass is skipped, the next one refreshes the response
+            self.assertFalse(refresher.done())
+            refresh.assert_not_called()
+            await self.client.get_json(URL, 0.01)
+            await asyncio.sleep(0.03)
+            refresher.cancel()
+
+        refresh.assert_called()
+
+    async def test_errors_not_cached(self):
+        self.status_code = 404
+
+        self.assertEqual(await self.client.get_json(URL, 600), (404, {"cod": 1}))
+        self.assertEqual(await self.client.get_json(URL, 600), (404, {"cod": 2}))
+
+    async def test_coalesced(self):
+        results = await asyncio.gather(
+            *[self.client.get_json(URL, 600) for _ in range(10)]
+        )
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [(200, {"cod": 1})] * 10)
+
+    async def test_stale_while_revalidate(self):
+        await self.client.get_json(URL, 0, stale=600)
+
+        # The expired response is served right away and refreshed in the background
+        self.assertEqual(
+            await self.client.get_json(URL, 0, stale=600), (200, {"cod": 1})
+        )
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(await self.client.get_json(URL, 600), (200, {"cod": 2}))
+
+    async def test_circuit_breaker(self):
+        self.client.breakers["weather"].min_calls = 1
+        await self.client.get_json(URL, 0, stale=600, upstream="weather")
+        self.status_code = 500
+        self.assertEqual(
+            await self.client.get_json(f"{URL}&lang=de", 600, upstream="weather"),
+            (500, {"cod": 2}),
+        )
+
+        # While the breaker is open the cached response is still served
+        self.assertEqual(self.client.breakers["weather"].state, "open")
+        self.assertEqual(
+            await self.client.get_json(URL, 0, stale=600, upstream="weather"),
+            (200, {"cod": 1}),
+        )
+        with self.assertRaises(HTTPException) as cm:
+            await self.client.get_json(f"{URL}&lang=fr", 600, upstream="weather")
+        self.assertEqual(cm.exception.status_code, 503)
+        self.assertEqual(self.calls, 2)
+
+    async def test_fallback(self):
+        await self.client.get_json(URL, 0)
+
+        async def unavailable():
+            raise HTTPException(status_code=503, detail="quota is exhausted")
+
+        # The expired response is served when the upstream cannot be called
+        self.assertEqual(
+            await self.client.get_json(URL, 0, load=unavailable), (200, {"cod": 1})
+        )
+        with self.assertRaises(HTTPException):
+            await self.client.get_json(f"{URL}&lang=de", 0, load=unavailable)
+
+    async def test_fallback_on_error_response(self):
+        await self.client.get_json(URL, 0)
+
+        for status_code in (429, 503):
+            self.status_code = status_code
+            self.assertEqual(await self.client.get_json(URL, 0), (200, {"cod": 1}))
+        self.assertEqual(self.calls, 3)
+
+        self.assertEqual(
+            await self.client.get_json(f"{URL}&lang=de", 0), (503, {"cod": 4})
+        )
+
+    async def test_fallback_on_invalid_error_response(self):
+        await self.client.get_json(URL, 0)
+
+        async def handler(request):
+            return httpx.Response(502, text="<html>Bad Gateway</html>")
+
+        self.client.transport = httpx.MockTransport(handler)
+        await self.client.close()
+
+        self.assertEqual(await self.client.get_json(URL, 0), (200, {"cod": 1}))
+        with self.assertRaises(HTTPException) as cm:
+            await self.client.get_json(f"{URL}&lang=de", 0)
+        self.assertEqual(cm.exception.status_code, 502)
+
+    async def test_timeout(self):
+        async def handler(request):
+            raise httpx.ReadTimeout("timed out")
+
+        self.client.transport = httpx.MockTransport(handler)
+
+        with self.assertRaises(HTTPException) as cm:
+            await self.client.get_json(URL, 600)
+
+        self.assertEqual(cm.exception.status_code, 504)
+
+
+if __name__ == "__main__":
+    unittest.main()
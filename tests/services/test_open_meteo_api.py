@@ -1,55 +1,146 @@
+import asyncio
 import unittest
+from urllib.parse import parse_qs
 
+import httpx
 from fastapi import HTTPException
 from models.weather import AirQuality, ClimateStats
+from services.http_client import UpstreamClient
 from services.open_meteo import OpenMeteoAPI
+from utils.cache import SQLiteCache
 
 
-class TestOpenMeteoAPI(unittest.TestCase):
-    @classmethod
-    def setUpClass(cls):
-        cls.api = OpenMeteoAPI()
+class TestOpenMeteoAPI(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.api = OpenMeteoAPI(client=UpstreamClient())
 
-    def test_get_air_quality(self):
+    async def asyncTearDown(self):
+        await self.api.client.close()
+
+    async def test_get_air_quality(self):
         query_params = {"latitude": 51.5074, "longitude": 0.1278}
-        response = self.api.get_air_quality(query_params)
+        response = await self.api.get_air_quality(query_params)
 
         self.assertIsInstance(response, AirQuality)
 
-    def test_get_historical_data(self):
+    async def test_get_historical_data(self):
         query_params = {"latitude": 51.5074, "longitude": 0.1278, "units": "metric"}
-        response = self.api.get_historical_data(query_params)
+        response = await self.api.get_historical_data(query_params)
 
         self.assertIsInstance(response, ClimateStats)
 
-    def test_get_api_response_climate(self):
+    async def test_get_api_response_climate(self):
         query_params = {"latitude": 51.5074, "longitude": 0.1278, "units": "metric"}
         additional_params = "start_date=2000-01-01&end_date=2001-01-01&models=EC_Earth3P_HR&daily=temperature_2m_mean"
-        response = self.api.get_api_response("climate", additional_params, query_params)
+        response = await self.api.get_api_response(
+            "climate", additional_params, query_params
+        )
 
         self.assertIsInstance(response, dict)
         self.assertIn("daily", response)
         self.assertIn("temperature_2m_mean", response["daily"])
 
-    def test_get_api_response_error(self):
+    async def test_get_api_response_error(self):
         query_params = {"lat": 51.5074, "lon": 0.1278, "units": "metric"}
         additional_params = "start_date=2000-01-01&end_date=2001-01-01&models=EC_Earth3P_HR&daily=temperature_2m_mean"
 
         with self.assertRaises(HTTPException) as cm:
-            response = self.api.get_api_response(
+            response = await self.api.get_api_response(
                 "climate", additional_params, query_params
             )
 
         self.assertEqual(cm.exception.status_code, 400)
         self.assertEqual(cm.exception.detail, "Could not fetch data from OpenMeteo API")
 
-    def test_get_api_response_missing(self):
+    async def test_get_api_response_missing(self):
         query_params = {"latitude": 51.5074, "longitude": 0.1278, "units": "metric"}
         additional_params = "start_date=2000-01-01&end_date=2001-01-01&models=EC_Earth3P_HR&hourly=temperature_2m_mean"
-        response = self.api.get_api_response("climate", additional_params, query_params)
+        response = await self.api.get_api_response(
+            "climate", additional_params, query_params
+        )
         self.assertIsInstance(response, dict)
         self.assertNotIn("hourly", response)
 
 
+class TestOpenMeteoBatcher(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.requests = []
+
+        async def handler(request):
+            params = parse_qs(request.url.query.decode())
+            latitudes = params["latitude"][0].split(",")
+            self.requests.append(latitudes)
+            if "95.0" in latitudes or "-45.0" in latitudes:
+                return httpx.Response(
+                    400, json={"error": True, "reason": "Latitude must be in range"}
+                )
+            results = [{"latitude": float(latitude)} for latitude in latitudes]
+            return httpx.Response(200, json=results if len(results) > 1 else results[0])
+
+        self.api = OpenMeteoAPI(
+            client=UpstreamClient(
+                cache=SQLiteCache(":memory:"), transport=httpx.MockTransport(handler)
+            )
+        )
+
+    async def asyncTearDown(self):
+        await self.api.client.close()
+        await self.api.client.cache.close()
+
+    async def test_batched(self):
+        locations = [{"latitude": 10.0 + i, "longitude": 20.0} for i in range(5)]
+
+        results = await asyncio.gather(
+            *[
+                self.api.get_api_response(
+                    "air-quality", "hourly=european_aqi", location
+                )
+                for location in locations + locations[:2]
+            ]
+        )
+
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(len(self.requests[0]), 5)
+        self.assertEqual(
+            [result["latitude"] for result in results],
+            [10.0, 11.0, 12.0, 13.0, 14.0, 10.0, 11.0],
+        )
+
+        # The results are cached per location
+        await self.api.get_api_response(
+            "air-quality", "hourly=european_aqi", locations[3]
+        )
+        self.assertEqual(len(self.requests), 1)
+
+    async def test_rejected_location(self):
+        results = await asyncio.gather(
+            *[
+                self.api.get_api_response(
+                    "air-quality",
+                    "hourly=european_aqi",
+                    {"latitude": latitude, "longitude": 0.12},
+                )
+                for latitude in (51.5, 95.0, -45.0)
+            ],
+            return_exceptions=True,
+        )
+
+        # The out of range location gets its own request, the rejected batch is split
+        self.assertEqual(results[0], {"latitude": 51.5})
+        self.assertEqual(results[1].status_code, 400)
+        self.assertEqual(results[2].status_code, 400)
+        self.assertIn(["95.0"], self.requests)
+        self.assertIn(["51.5", "-45.0"], self.requests)
+        self.assertIn(["51.5"], self.requests)
+
+    async def test_single_location(self):
+        result = await self.api.get_api_response(
+            "air-quality", "hourly=european_aqi", {"latitude": 1.0, "longitude": 2.0}
+        )
+
+        self.assertEqual(result, {"latitude": 1.0})
+        self.assertEqual(self.api.batcher.batches, 1)
+
+
 if __name__ == "__main__":
     unittest.main()
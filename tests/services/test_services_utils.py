@@ -1,6 +1,13 @@
 import unittest
 
-from utils.services import parse_query, units_appendix
+from utils.services import (
+    etag_matches,
+    normalize_city,
+    normalize_url,
+    parse_query,
+    quantize_coordinates,
+    units_appendix,
+)
 
 
 class TestServices(unittest.TestCase):
@@ -20,6 +27,40 @@ class TestServices(unittest.TestCase):
             units_imperial, "&temperature_unit=fahrenheit&windspeed_unit=mph"
         )
 
+    def test_normalize_url(self):
+        url = "https://api.openweathermap.org/data/2.5/weather?appid=123&q= London &units=metric"
+        same_url = "https://API.openweathermap.org/data/2.5/weather?units=metric&q=london&appid=456"
+
+        self.assertEqual(normalize_url(url), normalize_url(same_url))
+        self.assertNotIn("appid", normalize_url(url))
+
+    def test_quantize_coordinates(self):
+        params = {"lat": 51.50741, "lon": 0.12779, "units": "metric"}
+        nearby = {"lat": 51.50702, "lon": 0.12812, "units": "metric"}
+
+        self.assertEqual(
+            quantize_coordinates(params, step=0.01),
+            {"lat": 51.51, "lon": 0.13, "units": "metric"},
+        )
+        self.assertEqual(
+            quantize_coordinates(params, step=0.01),
+            quantize_coordinates(nearby, step=0.01),
+        )
+        self.assertEqual(quantize_coordinates({"q": "London"}), {"q": "London"})
+
+    def test_normalize_city(self):
+        self.assertEqual(normalize_city(" Zürich ,CH"), "zurich,ch")
+        self.assertEqual(normalize_city("São  Paulo"), normalize_city("sao paulo"))
+
+    def test_etag_matches(self):
+        etag = '"abc"'
+
+        self.assertTrue(etag_matches('"abc"', etag))
+        self.assertTrue(etag_matches('"xyz", W/"abc"', etag))
+        self.assertTrue(etag_matches("*", etag))
+        self.assertFalse(etag_matches('"xyz"', etag))
+        self.assertFalse(etag_matches(None, etag))
+
 
 if __name__ == "__main__":
     unittest.main()
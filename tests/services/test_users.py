@@ -0,0 +1,70 @@
+import time
+import unittest
+
+import jwt
+from services.users import UserService, token_ttl
+from utils.cache import SQLiteCache
+
+
+class FakeAuth:
+    def __init__(self):
+        self.calls = 0
+
+    def get_account_info(self, token):
+        self.calls += 1
+        return {"users": [{"localId": "uid"}]}
+
+
+class FakeDB:
+    def __init__(self):
+        self.calls = 0
+        self.tier = "free"
+
+    def child(self, *args):
+        return self
+
+    def get(self):
+        self.calls += 1
+        return self
+
+    def val(self):
+        return {"tier": self.tier}
+
+
+class TestUserService(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.token = jwt.encode({"exp": int(time.time()) + 3600}, "secret")
+        self.users = UserService(FakeAuth(), FakeDB(), SQLiteCache(":memory:"))
+
+    async def asyncTearDown(self):
+        await self.users.store.close()
+
+    async def test_cached(self):
+        for _ in range(3):
+            uid = await self.users.get_uid(self.token)
+            self.assertEqual(await self.users.get_tier(uid), "free")
+
+        self.assertEqual(self.users.auth.calls, 1)
+        self.assertEqual(self.users.db.calls, 1)
+
+    async def test_invalidate(self):
+        await self.users.get_tier("uid")
+        self.users.db.tier = "paid"
+        await self.users.invalidate("uid")
+
+        self.assertEqual(await self.users.get_tier("uid"), "paid")
+
+    async def test_expired_token_not_cached(self):
+        token = jwt.encode({"exp": int(time.time()) - 10}, "secret")
+        await self.users.get_uid(token)
+        await self.users.get_uid(token)
+
+        self.assertEqual(self.users.auth.calls, 2)
+
+    def test_token_ttl(self):
+        self.assertAlmostEqual(token_ttl(self.token), 3600, delta=5)
+        self.assertEqual(token_ttl("invalid_jwt_token_here"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
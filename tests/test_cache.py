@@ -0,0 +1,94 @@
+import unittest
+
+from fakeredis import aioredis
+from utils.cache import MemoryCache, RedisCache, SQLiteCache
+
+
+class TestSQLiteCache(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.cache = SQLiteCache(":memory:")
+        await self.cache.open()
+
+    async def asyncTearDown(self):
+        await self.cache.close()
+
+    async def test_set_get(self):
+        await self.cache.set("weather", {"cod": 200}, 600)
+
+        self.assertEqual(await self.cache.get("weather"), {"cod": 200})
+        self.assertIsNone(await self.cache.get("forecast"))
+
+    async def test_expired(self):
+        await self.cache.set("weather", {"cod": 200}, -1)
+
+        self.assertIsNone(await self.cache.get("weather"))
+
+    async def test_delete(self):
+        await self.cache.set("weather", {"cod": 200}, 600)
+        await self.cache.delete("weather")
+
+        self.assertIsNone(await self.cache.get("weather"))
+
+
+class TestRedisCache(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.redis = aioredis.FakeRedis()
+        self.cache = RedisCache(self.redis)
+
+    async def asyncTearDown(self):
+        await self.redis.flushall()
+        await self.redis.close()
+
+    async def test_set_get(self):
+        await self.cache.set("weather", {"cod": 200}, 600)
+
+        self.assertEqual(await self.cache.get("weather"), {"cod": 200})
+        self.assertIsNone(await self.cache.get("forecast"))
+        self.assertEqual(await self.cache.stats(), {"hits": 1, "misses": 1})
+        self.assertEqual(await self.redis.ttl("upstream:weather"), 600)
+
+    async def test_shared_stats(self):
+        # Every worker counts into the same hash
+        other = RedisCache(self.redis)
+        await self.cache.set("weather", {"cod": 200}, 600)
+        await other.get("weather")
+        await self.cache.get("forecast")
+
+        self.assertEqual(await other.stats(), {"hits": 1, "misses": 1})
+
+    async def test_delete(self):
+        await self.cache.set("weather", {"cod": 200}, 600)
+        await self.cache.delete("weather")
+
+        self.assertIsNone(await self.cache.get("weather"))
+
+
+class TestMemoryCache(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.cache = MemoryCache(size=2)
+
+    async def test_set_get(self):
+        await self.cache.set("paid:metric:q=london", b"{}", 600)
+
+        self.assertEqual(await self.cache.get("paid:metric:q=london"), b"{}")
+        self.assertIsNone(await self.cache.get("free:metric:q=london"))
+        self.assertEqual(await self.cache.stats(), {"hits": 1, "misses": 1})
+
+    async def test_expired(self):
+        await self.cache.set("weather", b"{}", -1)
+
+        self.assertIsNone(await self.cache.get("weather"))
+
+    async def test_evicted(self):
+        await self.cache.set("london", b"{}", 600)
+        await self.cache.set("paris", b"{}", 600)
+        await self.cache.get("london")
+        await self.cache.set("rome", b"{}", 600)
+
+        # Paris is the least recently used
+        self.assertIsNone(await self.cache.get("paris"))
+        self.assertEqual(await self.cache.get("london"), b"{}")
+
+
+if __name__ == "__main__":
+    unittest.main()
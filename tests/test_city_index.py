@@ -0,0 +1,33 @@
+import unittest
+
+from utils.cache import SQLiteCache
+from utils.city_index import CityIndex
+
+LONDON = {"lat": 51.5085, "lon": -0.1257, "name": "London", "country": "GB"}
+
+
+class TestCityIndex(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.index = CityIndex(store=SQLiteCache(":memory:"), size=2)
+
+    async def asyncTearDown(self):
+        await self.index.store.close()
+
+    async def test_learn_get(self):
+        await self.index.learn("London", LONDON)
+
+        self.assertEqual(await self.index.get("  london "), LONDON)
+        self.assertIsNone(await self.index.get("Paris"))
+
+    async def test_backed_by_store(self):
+        await self.index.learn("London", LONDON)
+        await self.index.learn("Paris", {**LONDON, "name": "Paris"})
+        await self.index.learn("Rome", {**LONDON, "name": "Rome"})
+
+        # London was evicted from the LRU but is still in the store
+        self.assertNotIn("london", self.index._lru)
+        self.assertEqual(await self.index.get("London"), LONDON)
+
+
+if __name__ == "__main__":
+    unittest.main()
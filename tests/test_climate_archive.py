@@ -0,0 +1,63 @@
+import tempfile
+import unittest
+from datetime import date
+
+import numpy as np
+from tests.test_climate_store import climate_response
+from utils.climate_archive import ClimateArchive, ClimateArchiveWriter
+from utils.climate_store import ClimateSeries
+
+
+class TestClimateArchive(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.archive = ClimateArchive(path=self.directory.name)
+        self.series = ClimateSeries.from_response(
+            climate_response(date(2000, 1, 1), 3 * 365 + 1)
+        )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, *series: ClimateSeries) -> None:
+        writer = ClimateArchiveWriter(
+            self.archive, "metric", [(51.51, -0.13), (48.86, 2.35), (41.9, 12.5)]
+        )
+        for row, location in enumerate(series):
+            writer.add(row, location)
+        writer.publish()
+
+    def test_same_day(self):
+        self.write(self.series)
+
+        years, metrics = self.archive.same_day(51.51, -0.13, "metric", date(2024, 1, 2))
+        expected_years, expected_metrics = self.series.same_day(date(2024, 1, 2))
+        np.testing.assert_array_equal(years, expected_years)
+        np.testing.assert_array_equal(metrics, expected_metrics)
+
+    def test_decimals(self):
+        response = climate_response(date(2000, 1, 1), 366)
+        for values in response["daily"].values():
+            values[1] = 5.3 if values[1] is not None else None
+        response["daily"]["pressure_msl_mean"][1] = 1013.27
+        self.write(ClimateSeries.from_response(response))
+
+        _, metrics = self.archive.same_day(51.51, -0.13, "metric", date(2024, 1, 2))
+
+        self.assertEqual(metrics[:, 0].tolist(), [5.3, 5.3, 5.3, 5.3, 5.3, 1013.27])
+
+    def test_not_archived(self):
+        other = ClimateSeries.from_response(climate_response(date(2001, 1, 1), 365))
+        self.write(self.series, other)
+
+        # Paris has other days than London, Rome was never written
+        self.assertIsNone(self.archive.same_day(48.86, 2.35, "metric", date.today()))
+        self.assertIsNone(self.archive.same_day(41.9, 12.5, "metric", date.today()))
+        self.assertIsNone(self.archive.same_day(51.51, -0.13, "imperial", date.today()))
+
+    def test_without_archive(self):
+        self.assertIsNone(self.archive.same_day(51.51, -0.13, "metric", date.today()))
+
+
+if __name__ == "__main__":
+    unittest.main()
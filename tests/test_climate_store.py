@@ -0,0 +1,63 @@
+import tempfile
+import unittest
+from datetime import date, timedelta
+
+import numpy as np
+from utils.climate_store import ClimateSeries, ClimateStore
+from utils.parsers.open_meteo import CLIMATE_METRICS
+
+
+def climate_response(start: date, days: int) -> dict:
+    return {
+        "daily": {
+            "time": [str(start + timedelta(days=i)) for i in range(days)],
+            **{
+                series: [float(i) if i % 7 else None for i in range(days)]
+                for series in CLIMATE_METRICS.values()
+            },
+        }
+    }
+
+
+class TestClimateStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = ClimateStore(path=self.directory.name, size=1)
+        self.series = ClimateSeries.from_response(
+            climate_response(date(2000, 1, 1), 3 * 365 + 1)
+        )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_same_day(self):
+        years, metrics = self.series.same_day(date(2024, 1, 2))
+
+        np.testing.assert_array_equal(years, [2000, 2001, 2002])
+        np.testing.assert_array_equal(metrics[0], [1.0, 367.0, 732.0])
+
+    def test_leap_day(self):
+        years, metrics = self.series.same_day(date(2024, 2, 29))
+
+        np.testing.assert_array_equal(years, [2000])
+        np.testing.assert_array_equal(metrics[0], [59.0])
+
+    def test_missing_values(self):
+        _, metrics = self.series.same_day(date(2024, 1, 1))
+
+        # The first day of the series is missing (None)
+        self.assertTrue(np.isnan(metrics[0, 0]))
+
+    def test_save_get(self):
+        self.store.save("london", self.series)
+        self.store.save("paris", self.series)
+
+        # London was evicted from the LRU but is still stored on disk
+        self.assertNotIn("london", self.store._lru)
+        years, metrics = self.store.get("london").same_day(date(2024, 3, 1))
+        np.testing.assert_array_equal(years, [2000, 2001, 2002])
+        self.assertIsNone(self.store.get("rome"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import gzip
+import unittest
+
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+from utils.compression import CompressionMiddleware, negotiate
+
+BODY = b'{"forecast":[' + b",".join([b'{"temp":12.5}'] * 200) + b"]}"
+
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        app = FastAPI()
+        app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+        @app.get("/large")
+        async def large():
+            return Response(BODY, media_type="application/json")
+
+        @app.get("/small")
+        async def small():
+            return Response(b"{}", media_type="application/json")
+
+        @app.get("/encoded")
+        async def encoded():
+            return Response(
+                gzip.compress(BODY),
+                media_type="application/json",
+                headers={"Content-Encoding": "gzip"},
+            )
+
+        self.client = TestClient(app)
+
+    def test_negotiate(self):
+        self.assertEqual(negotiate("gzip, deflate"), "gzip")
+        self.assertEqual(negotiate("*"), negotiate("zstd, br, gzip"))
+        self.assertIsNone(negotiate("gzip;q=0, deflate"))
+        self.assertIsNone(negotiate(None))
+
+    def test_compressed(self):
+        response = self.client.get("/large", headers={"Accept-Encoding": "gzip"})
+
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertEqual(response.headers["vary"], "Accept-Encoding")
+        self.assertLess(int(response.headers["content-length"]), len(BODY))
+        self.assertEqual(response.content, BODY)
+
+    def test_not_compressed(self):
+        small = self.client.get("/small", headers={"Accept-Encoding": "gzip"})
+        identity = self.client.get("/large", headers={"Accept-Encoding": "identity"})
+
+        self.assertNotIn("content-encoding", small.headers)
+        self.assertNotIn("content-encoding", identity.headers)
+        self.assertEqual(identity.content, BODY)
+
+    def test_already_encoded(self):
+        response = self.client.get("/encoded", headers={"Accept-Encoding": "gzip"})
+
+        # Compressed once by the route, not again by the middleware
+        self.assertEqual(response.content, BODY)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from fastapi import HTTPException
+from utils.concurrency import BlockingPool, SingleFlight, with_deadline
+
+
+class TestConcurrency(unittest.IsolatedAsyncioTestCase):
+    async def test_with_deadline(self):
+        async def fast():
+            return "done"
+
+        self.assertEqual(await with_deadline(fast(), 1, "weather"), "done")
+
+    async def test_with_deadline_timeout(self):
+        with self.assertRaises(HTTPException) as cm:
+            await with_deadline(asyncio.sleep(1), 0.01, "climate")
+
+        self.assertEqual(cm.exception.status_code, 504)
+        self.assertEqual(cm.exception.detail, "Timed out fetching climate data")
+
+    async def test_single_flight(self):
+        flights = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"cod": 200}
+
+        results = await asyncio.gather(
+            *[flights.do("london", fetch) for _ in range(10)]
+        )
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"cod": 200}] * 10)
+        self.assertEqual(flights.in_flight(), 0)
+
+    async def test_single_flight_error(self):
+        flights = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise HTTPException(status_code=404, detail="city not found")
+
+        results = await asyncio.gather(
+            flights.do("london", fail),
+            flights.do("london", fail),
+            return_exceptions=True,
+        )
+
+        self.assertTrue(all(isinstance(e, HTTPException) for e in results))
+        self.assertEqual(flights.in_flight(), 0)
+
+
+class TestBlockingPool(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.pool = BlockingPool("firebase", max_workers=1, max_queue=1, timeout=0.1)
+        self.release = threading.Event()
+
+    async def asyncTearDown(self):
+        self.release.set()
+        self.pool.shutdown()
+
+    async def test_run(self):
+        result = await self.pool.run(lambda: threading.current_thread().name)
+
+        self.assertTrue(result.startswith("firebase"))
+        self.assertEqual(self.pool.stats()["completed"], 1)
+
+    async def test_errors_raised(self):
+        with self.assertRaises(KeyError):
+            await self.pool.run(lambda: {}["tier"])
+
+    async def test_timeout(self):
+        with self.assertRaises(HTTPException) as cm:
+            await self.pool.run(self.release.wait)
+
+        self.assertEqual(cm.exception.status_code, 504)
+        self.assertEqual(cm.exception.detail, "Timed out calling firebase")
+        # The call still holds its thread until it returns
+        self.assertEqual(self.pool.stats()["running"], 1)
+
+    async def test_queued_timeout(self):
+        running = asyncio.ensure_future(self.pool.run(self.release.wait))
+        await asyncio.sleep(0.01)
+
+        with self.assertRaises(HTTPException):
+            await self.pool.run(time.sleep, 0)
+        await asyncio.gather(running, return_exceptions=True)
+        self.release.set()
+        await asyncio.sleep(0.05)
+
+        # The queued call timed out before it started, only the running one completed
+        self.assertEqual(self.pool.stats()["completed"], 1)
+        self.assertEqual(self.pool.stats()["queued"], 0)
+
+    async def test_rejected_when_full(self):
+        running = asyncio.ensure_future(self.pool.run(self.release.wait))
+        await asyncio.sleep(0.01)
+        queued = asyncio.ensure_future(self.pool.run(time.sleep, 0))
+        await asyncio.sleep(0.01)
+
+        with self.assertRaises(HTTPException) as cm:
+            await self.pool.run(time.sleep, 0)
+
+        self.assertEqual(cm.exception.status_code, 503)
+        self.assertEqual(self.pool.stats()["queued"], 1)
+        self.release.set()
+        await asyncio.gather(running, queued)
+        self.assertEqual(self.pool.stats()["rejected"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import asyncio
+import unittest
+
+from fakeredis import aioredis
+from fastapi import HTTPException
+from utils.quota import QuotaScheduler, RedisTokenBucket, TokenBucket
+
+
+class TestTokenBucket(unittest.IsolatedAsyncioTestCase):
+    async def test_take(self):
+        bucket = TokenBucket(calls_per_minute=60, burst=2)
+
+        self.assertEqual(await bucket.take(), 0)
+        self.assertEqual(await bucket.take(), 0)
+        self.assertAlmostEqual(await bucket.take(), 1, places=1)
+        self.assertEqual((await bucket.stats())["granted"], 2)
+
+
+class TestRedisTokenBucket(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.redis = aioredis.FakeRedis()
+
+    async def asyncTearDown(self):
+        await self.redis.flushall()
+        await self.redis.close()
+
+    async def test_take(self):
+        bucket = RedisTokenBucket(calls_per_minute=60, burst=2, redis=self.redis)
+
+        self.assertEqual(await bucket.take(), 0)
+        self.assertEqual(await bucket.take(), 0)
+        self.assertAlmostEqual(await bucket.take(), 1, places=1)
+        stats = await bucket.stats()
+        self.assertEqual(stats["granted"], 2)
+        self.assertLess(stats["tokens"], 1)
+
+    async def test_shared(self):
+        # Each worker has its own bucket object, the tokens are shared in Redis
+        buckets = [
+            RedisTokenBucket(calls_per_minute=60, burst=3, redis=self.redis)
+            for _ in range(2)
+        ]
+
+        waits = [await bucket.take() for bucket in buckets + buckets]
+
+        self.assertEqual(waits[:3], [0, 0, 0])
+        self.assertGreater(waits[3], 0)
+        self.assertEqual((await buckets[1].stats())["granted"], 3)
+
+
+class TestQuotaScheduler(unittest.IsolatedAsyncioTestCase):
+    async def test_priority(self):
+        scheduler = QuotaScheduler(
+            "OpenWeatherMap", TokenBucket(calls_per_minute=6000, burst=1), max_wait=1
+        )
+        await scheduler.acquire("free")
+        order = []
+
+        async def acquire(priority):
+            await scheduler.acquire(priority)
+            order.append(priority)
+
+        await asyncio.gather(acquire("background"), acquire("free"), acquire("paid"))
+
+        self.assertEqual(order, ["paid", "free", "background"])
+        self.assertEqual(
+            (await scheduler.stats())["granted_by_priority"],
+            {"free": 2, "paid": 1, "background": 1},
+        )
+
+    async def test_exhausted(self):
+        scheduler = QuotaScheduler(
+            "OpenWeatherMap", TokenBucket(calls_per_minute=1, burst=1), max_wait=0.01
+        )
+        await scheduler.acquire("paid")
+
+        with self.assertRaises(HTTPException) as cm:
+            await scheduler.acquire("paid")
+        self.assertEqual(cm.exception.status_code, 503)
+        self.assertEqual(cm.exception.detail, "OpenWeatherMap quota is exhausted")
+        self.assertEqual((await scheduler.stats())["rejected_by_priority"], {"paid": 1})
@@ -0,0 +1,95 @@
+import asyncio
+import unittest
+
+from fastapi import HTTPException
+from utils.resilience import Bulkhead, CircuitBreaker
+
+
+async def fail():
+    raise HTTPException(status_code=502, detail="Upstream API is unreachable")
+
+
+async def not_found():
+    raise HTTPException(status_code=404, detail="city not found")
+
+
+async def succeed():
+    return {"cod": 200}
+
+
+class TestCircuitBreaker(unittest.IsolatedAsyncioTestCase):
+    async def test_opens_on_failure_rate(self):
+        breaker = CircuitBreaker("weather", min_calls=4, failure_rate=0.5)
+        for call in (succeed, fail, succeed):
+            try:
+                await breaker.call(call)
+            except HTTPException:
+                pass
+        self.assertEqual(breaker.state, "closed")
+
+        with self.assertRaises(HTTPException):
+            await breaker.call(fail)
+        self.assertEqual(breaker.state, "open")
+
+        with self.assertRaises(HTTPException) as cm:
+            await breaker.call(succeed)
+        self.assertEqual(cm.exception.status_code, 503)
+        self.assertEqual(cm.exception.detail, "weather upstream is unavailable")
+
+    async def test_client_errors_do_not_count(self):
+        breaker = CircuitBreaker("weather", min_calls=2)
+        for _ in range(4):
+            with self.assertRaises(HTTPException):
+                await breaker.call(not_found)
+
+        self.assertEqual(breaker.state, "closed")
+
+    async def test_failed_results_and_slow_calls_count(self):
+        breaker = CircuitBreaker("climate", min_calls=2, slow_call=0.01)
+
+        async def slow():
+            await asyncio.sleep(0.02)
+            return {"cod": 200}
+
+        await breaker.call(succeed, failed=lambda result: result["cod"] == 200)
+        await breaker.call(slow)
+
+        self.assertEqual(breaker.state, "open")
+
+    async def test_half_open_probe(self):
+        breaker = CircuitBreaker("forecast", min_calls=1, open_seconds=0.01, probes=1)
+        with self.assertRaises(HTTPException):
+            await breaker.call(fail)
+        await asyncio.sleep(0.02)
+
+        with self.assertRaises(HTTPException):
+            await breaker.call(fail)
+        self.assertEqual(breaker.state, "open")
+        await asyncio.sleep(0.02)
+
+        async def probe_call():
+            await asyncio.sleep(0.01)
+            return {"cod": 200}
+
+        probe = asyncio.create_task(breaker.call(probe_call))
+        await asyncio.sleep(0)
+        with self.assertRaises(HTTPException):
+            await breaker.call(succeed)
+        self.assertEqual(await probe, {"cod": 200})
+        self.assertEqual(breaker.stats(), {"state": "closed", "failure_rate": 0.0})
+
+
+class TestBulkhead(unittest.IsolatedAsyncioTestCase):
+    async def test_busy(self):
+        bulkhead = Bulkhead("climate", max_concurrent=1, max_wait=0.01)
+        running = asyncio.create_task(bulkhead.run(lambda: asyncio.sleep(0.05)))
+        await asyncio.sleep(0)
+
+        with self.assertRaises(HTTPException) as cm:
+            await bulkhead.run(succeed)
+        self.assertEqual(cm.exception.status_code, 503)
+        self.assertEqual(bulkhead.stats(), {"in_flight": 1, "limit": 1})
+
+        await running
+        self.assertEqual(await bulkhead.run(succeed), {"cod": 200})
+        self.assertEqual(bulkhead.stats(), {"in_flight": 0, "limit": 1})
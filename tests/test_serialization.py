@@ -0,0 +1,65 @@
+import json
+import unittest
+
+from fastapi.encoders import jsonable_encoder
+from models.weather import Forecast
+from utils.serialization import SerializedJSONResponse, ndjson_line
+
+WEATHER = {
+    "dt": 1697803200,
+    "temp": 12.5,
+    "temp_min": 11.0,
+    "temp_max": 13.2,
+    "feels_like": 11.8,
+    "pressure": 1012,
+    "humidity": 81,
+    "clouds": 75,
+    "wind_speed": 4.1,
+    "visibility": 10000,
+    "rain": 0.12,
+    "weather_main": "Rain",
+    "weather_description": "light rain",
+    "weather_icon": "10d",
+    "pod": "d",
+    "rain_prob": 0.4,
+    "dt_txt": "2023-10-20 12:00:00",
+}
+
+
+class TestSerialization(unittest.TestCase):
+    def setUp(self):
+        self.forecast = Forecast(
+            name="Zürich",
+            country="CH",
+            lat=47.37,
+            lon=8.54,
+            forecasts=[WEATHER] * 40,
+        )
+
+    def test_same_json_as_fastapi(self):
+        content = {"forecast": self.forecast, "units": {"rain": "mm/h"}}
+
+        response = SerializedJSONResponse(content)
+
+        self.assertEqual(json.loads(response.body), jsonable_encoder(content))
+
+    def test_copy_reuses_forecasts(self):
+        self.forecast.json_bytes()
+        copy = self.forecast.copy(update={"lat": 47.3769})
+
+        self.assertIs(copy._forecasts_json, self.forecast._forecasts_json)
+        self.assertEqual(json.loads(copy.json_bytes()), jsonable_encoder(copy))
+        self.assertEqual(json.loads(copy.json_bytes())["lat"], 47.3769)
+
+    def test_ndjson_line(self):
+        line = ndjson_line("forecast", self.forecast)
+
+        self.assertTrue(line.endswith(b"\n"))
+        self.assertEqual(
+            json.loads(line),
+            {"section": "forecast", "data": jsonable_encoder(self.forecast)},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+import asyncio
+import sys
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import orjson
+from fastapi import HTTPException
+from pydantic import ValidationError
+from utils.cache import MemoryCache
+
+# The routes only need the users service for authenticated requests
+with mock.patch.dict(sys.modules, {"config.firebase": mock.Mock()}):
+    from models.batch import WeatherBatch
+    from routes import weather
+
+QUERY = {"lat": 51.51, "lon": -0.13, "units": "metric"}
+
+
+class Section(dict):
+    """Stand-in for the parsed upstream models"""
+
+    lat = 51.51
+    lon = -0.13
+    name = "London"
+    country = "GB"
+
+    def copy(self, update=None):
+        return Section({**self, **(update or {})})
+
+
+class TestWeatherResponses(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.weather = mock.AsyncMock(return_value=Section(temp=12.5))
+        self.forecast = mock.AsyncMock(return_value=Section(forecasts=[]))
+        self.air_quality = mock.AsyncMock(
+            return_value=SimpleNamespace(aqi={"european_aqi": 20})
+        )
+        self.historical = mock.AsyncMock(
+            return_value=SimpleNamespace(climate={"temp": [12.0]}, summary={})
+        )
+        for target, name, value in (
+            (weather, "responses", MemoryCache(size=10)),
+            (weather.api, "get_weather", self.weather),
+            (weather.api, "get_forecast", self.forecast),
+            (weather.alt_api, "get_air_quality", self.air_quality),
+            (weather.alt_api, "get_historical_data", self.historical),
+        ):
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_paid(self):
+        response = await weather.call_api(QUERY, "paid")
+
+        self.assertEqual(
+            list(response),
+            [
+                "weather",
+                "forecast",
+                "units",
+                "air_quality",
+                "historical",
+                "historical_summary",
+            ],
+        )
+        self.assertEqual(response["air_quality"], {"european_aqi": 20})
+
+    async def test_optional_section_fails(self):
+        self.historical.side_effect = ValueError("Expecting value: line 1 column 1")
+
+        response = await weather.call_api(QUERY, "paid")
+
+        self.assertIsNone(response["historical"])
+        self.assertEqual(response["air_quality"], {"european_aqi": 20})
+        self.assertEqual(response["unavailable"], ["historical"])
+
+    async def test_required_section_fails(self):
+        self.weather.side_effect = HTTPException(
+            status_code=404, detail="city not found"
+        )
+
+        with self.assertRaises(HTTPException):
+            await weather.call_api(QUERY, "paid")
+
+    async def test_stream_section_fails(self):
+        async def get_forecast(*args, **kwargs):
+            await asyncio.sleep(0.01)
+            raise KeyError("units")
+
+        self.forecast.side_effect = get_forecast
+
+        response = await weather.streamed_call_api(QUERY, "free")
+        lines = [orjson.loads(line) async for line in response.body_iterator]
+
+        self.assertEqual(lines[0]["section"], "weather")
+        self.assertEqual(
+            lines[-1],
+            {
+                "section": "error",
+                "data": {"status": 500, "message": "Internal server error"},
+            },
+        )
+        self.assertIsNone(
+            await weather.responses.get(weather.response_key(QUERY, "free"))
+        )
+
+    async def test_batch_location_fails(self):
+        self.forecast.side_effect = [KeyError("units"), Section(forecasts=[])]
+        queries = [
+            {"lat": 1.0, "lon": 2.0, "units": "metric"},
+            {"lat": 3.0, "lon": 4.0, "units": "metric"},
+            {"lat": 1.0, "lon": 2.0, "units": "metric"},
+        ]
+
+        lines = [
+            orjson.loads(line) async for line in weather.batch_call_api(queries, "free")
+        ]
+
+        self.assertEqual(sorted(line["index"] for line in lines), [0, 1, 2])
+        self.assertEqual(sorted(line["status"] for line in lines), [200, 500, 500])
+        self.assertEqual(self.forecast.await_count, 2)
+
+    async def test_store_response(self):
+        key = weather.response_key(QUERY, "free")
+        entry = await weather.store_response(
+            key, "free", {"weather": 1}, [time.time() + 30.5]
+        )
+
+        self.assertLessEqual(entry["expires"] - time.time(), 30)
+        self.assertIs(await weather.responses.get(key), entry)
+
+        # Built from stale upstream responses, it is served but not cached
+        await weather.responses.delete(key)
+        await weather.store_response(key, "free", {"weather": 1}, [time.time() - 5])
+        self.assertIsNone(await weather.responses.get(key))
+
+    async def test_cached_entry(self):
+        first = await weather.cached_entry(QUERY, "free")
+        second = await weather.cached_entry(QUERY, "free")
+
+        self.assertIs(first, second)
+        self.assertEqual(self.weather.await_count, 1)
+
+    async def test_cached_call_api(self):
+        async def get_weather(*args, **kwargs):
+            # The upstream response was fetched a while ago, it is fresh for 30 more seconds
+            weather.upstream_expiries.get().append(time.time() + 30.5)
+            return Section(temp=12.5)
+
+        self.weather.side_effect = get_weather
+
+        response = await weather.cached_call_api(QUERY, "free")
+        etag = response.headers["ETag"]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            response.headers["Cache-Control"],
+            ("private, max-age=30", "private, max-age=29"),
+        )
+        self.assertEqual(orjson.loads(response.body)["weather"]["temp"], 12.5)
+
+        response = await weather.cached_call_api(QUERY, "free", if_none_match=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], etag)
+        self.assertEqual(self.weather.await_count, 1)
+
+    def test_batch_units(self):
+        with self.assertRaises(ValidationError):
+            WeatherBatch(token="empty", locations=[{"city": "Paris"}], units="kelvin")
+
+
+if __name__ == "__main__":
+    unittest.main()
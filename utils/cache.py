@@ -0,0 +1,186 @@
+import json
+import sqlite3
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from aioredis import Redis
+
+
+class ResponseCache:
+    """Interface of the caches for upstream API responses"""
+
+    hits: int = 0
+    misses: int = 0
+
+    async def open(self) -> None:
+        """Open the cache, called on app startup"""
+
+    async def close(self) -> None:
+        """Close the cache, called on app shutdown"""
+
+    async def get(self, key: str) -> dict | None:
+        """Get a cached value
+
+        Args:
+            key: cache key
+
+        Returns:
+            dict | None: cached value, or None if missing or expired
+        """
+        raise NotImplementedError
+
+    async def set(self, key: str, value: dict, ttl: int) -> None:
+        """Cache a value
+
+        Args:
+            key: cache key
+            value: JSON serializable value
+            ttl: how long (in seconds) the value is kept in the cache
+        """
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        """Remove a value from the cache
+
+        Args:
+            key: cache key
+        """
+        raise NotImplementedError
+
+    async def stats(self) -> dict[str, int]:
+        """Get the hit and miss counters of the cache
+
+        Returns:
+            dict[str, int]: number of cache hits and misses
+        """
+        return {"hits": self.hits, "misses": self.misses}
+
+    def count(self, value: dict | None) -> dict | None:
+        """Count a cache lookup as a hit or a miss"""
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+
+@dataclass
+class SQLiteCache(ResponseCache):
+    """Cache stored in a local SQLite file, the connection is kept open for the lifetime of the app"""
+
+    path: str = "demo_cache.sqlite"
+    _connection: sqlite3.Connection | None = field(default=None, init=False, repr=False)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS upstream_responses (key TEXT PRIMARY KEY, value TEXT, expires REAL)"
+            )
+            self._connection.execute(
+                "DELETE FROM upstream_responses WHERE expires <= ?", (time.time(),)
+            )
+            self._connection.commit()
+        return self._connection
+
+    async def open(self) -> None:
+        self.connection
+
+    async def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    async def get(self, key: str) -> dict | None:
+        row = self.connection.execute(
+            "SELECT value FROM upstream_responses WHERE key = ? AND expires > ?",
+            (key, time.time()),
+        ).fetchone()
+        return self.count(json.loads(row[0]) if row else None)
+
+    async def set(self, key: str, value: dict, ttl: int) -> None:
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO upstream_responses VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + ttl),
+            )
+
+    async def delete(self, key: str) -> None:
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM upstream_responses WHERE key = ?", (key,)
+            )
+
+
+@dataclass
+class MemoryCache(ResponseCache):
+    """Cache kept in the memory of each worker, values are stored as they are (e.g. pre-serialized bytes)"""
+
+    size: int = 1000
+    _entries: OrderedDict = field(default_factory=OrderedDict, init=False, repr=False)
+
+    async def get(self, key: str) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] <= time.time():
+            del self._entries[key]
+            entry = None
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return self.count(entry[0] if entry is not None else None)
+
+    async def set(self, key: str, value: Any, ttl: int) -> None:
+        self._entries[key] = (value, time.time() + ttl)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+
+@dataclass
+class RedisCache(ResponseCache):
+    """Cache stored in Redis, shared by all workers of the app
+
+    Values are stored as zlib compressed JSON. Hits and misses are counted in Redis
+    in the same round-trip as the lookup, so the counters cover the whole fleet.
+    """
+
+    redis: "Redis"
+    prefix: str = "upstream:"
+    stats_key: str = "upstream-stats"
+
+    # Get the value and count the hit or miss in one round-trip
+    GET_SCRIPT = """
+    local value = redis.call('GET', KEYS[1])
+    redis.call('HINCRBY', KEYS[2], value and 'hits' or 'misses', 1)
+    return value
+    """
+
+    def __post_init__(self):
+        self._get = self.redis.register_script(self.GET_SCRIPT)
+
+    async def get(self, key: str) -> dict | None:
+        value = await self._get(keys=[self.prefix + key, self.stats_key])
+        return json.loads(zlib.decompress(value)) if value else None
+
+    async def set(self, key: str, value: dict, ttl: int) -> None:
+        data = zlib.compress(json.dumps(value, separators=(",", ":")).encode())
+        await self.redis.set(self.prefix + key, data, ex=ttl)
+
+    async def delete(self, key: str) -> None:
+        await self.redis.delete(self.prefix + key)
+
+    async def stats(self) -> dict[str, int]:
+        stats = await self.redis.hgetall(self.stats_key)
+        return {
+            "hits": int(stats.get(b"hits", 0)),
+            "misses": int(stats.get(b"misses", 0)),
+        }
@@ -0,0 +1,56 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from utils.cache import ResponseCache, SQLiteCache
+from utils.services import normalize_city
+from utils.settings import CITY_INDEX
+
+
+@dataclass
+class CityIndex:
+    """Maps normalized city names to canonical coordinates, learned from previous responses
+
+    Recently used cities are kept in an in-memory LRU, backed by a persistent store
+    (Redis when the app runs, otherwise the local SQLite cache).
+    """
+
+    store: ResponseCache = field(default_factory=SQLiteCache)
+    size: int = CITY_INDEX["size"]
+    ttl: int = CITY_INDEX["ttl"]
+    _lru: OrderedDict = field(default_factory=OrderedDict, init=False, repr=False)
+
+    async def get(self, city: str) -> dict[str, float | str] | None:
+        """Get the canonical place of a city
+
+        Args:
+            city: city name
+
+        Returns:
+            dict[str, float | str] | None: coordinates, name and country of the city, or None if it is not known yet
+        """
+        key = normalize_city(city)
+        if key in self._lru:
+            self._lru.move_to_end(key)
+            return self._lru[key]
+        place = await self.store.get(f"city:{key}")
+        if place is not None:
+            self._remember(key, place)
+        return place
+
+    async def learn(self, city: str, place: dict[str, float | str]) -> None:
+        """Store the canonical place of a city
+
+        Args:
+            city: city name
+            place: coordinates, name and country of the city
+        """
+        key = normalize_city(city)
+        if self._lru.get(key) != place:
+            self._remember(key, place)
+            await self.store.set(f"city:{key}", place, self.ttl)
+
+    def _remember(self, key: str, place: dict[str, float | str]) -> None:
+        self._lru[key] = place
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.size:
+            self._lru.popitem(last=False)
@@ -0,0 +1,165 @@
+import glob
+import os
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import date
+
+import numpy as np
+from utils.climate_store import MONTH_STARTS, ClimateSeries
+from utils.parsers.open_meteo import CLIMATE_METRICS
+from utils.settings import CLIMATE_ARCHIVE_PATH
+
+# Decimals of the daily climate values sent by Open-Meteo
+DECIMALS = 2
+
+
+@dataclass
+class ClimateArchive:
+    """Read-only archive of the daily climate series of the tracked locations
+
+    The series are stored in one fixed-stride float32 file (location x day x metric),
+    memory-mapped so that all workers share the same page cache. The days are sorted by
+    month-day like in a ClimateSeries, so the same day across all years is one
+    contiguous block. The archive is written by the ingestion job (scripts/ingest_climate.py).
+    """
+
+    path: str = CLIMATE_ARCHIVE_PATH
+    _opened: bool = field(default=False, init=False, repr=False)
+    _query: str = field(default="", init=False, repr=False)
+    _rows: dict[tuple[float, float], int] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    _years: np.ndarray | None = field(default=None, init=False, repr=False)
+    _starts: np.ndarray | None = field(default=None, init=False, repr=False)
+    _metrics: np.ndarray | None = field(default=None, init=False, repr=False)
+
+    @property
+    def index(self) -> str:
+        return os.path.join(self.path, "index.npz")
+
+    def open(self) -> None:
+        """Map the latest archive, without it every location falls back to the live API"""
+        self._opened = True
+        if not os.path.exists(self.index):
+            return
+        with np.load(self.index) as index:
+            locations = index["locations"]
+            self._query = str(index["query"])
+            self._years = index["years"]
+            self._starts = index["starts"]
+            file = os.path.join(self.path, str(index["archive"]))
+        self._metrics = np.memmap(
+            file,
+            dtype=np.float32,
+            mode="r",
+            shape=(len(locations), self._years.size, len(CLIMATE_METRICS)),
+        )
+        self._rows = {
+            (lat, lon): row
+            for row, (lat, lon) in enumerate(locations.tolist())
+            if not np.isnan(lat)
+        }
+
+    def same_day(
+        self, lat: float, lon: float, query: str, day: date
+    ) -> tuple[np.ndarray, np.ndarray] | None:
+        """Get the same day throughout the years for a tracked location
+
+        Args:
+            lat: latitude, snapped to the coordinate grid
+            lon: longitude, snapped to the coordinate grid
+            query: params of the climate API call (units, model and date range)
+            day: day to get
+
+        Returns:
+            tuple[np.ndarray, np.ndarray] | None: year of each row and values of the climate metrics
+            (metric x year), or None if the location is not archived for this query
+        """
+        if not self._opened:
+            self.open()
+        row = self._rows.get((lat, lon))
+        if row is None or query != self._query:
+            return None
+        slot = MONTH_STARTS[day.month - 1] + day.day - 1
+        rows = slice(self._starts[slot], self._starts[slot + 1])
+        # Open-Meteo sends at most DECIMALS decimals, rounding drops the float32 noise,
+        # so 5.3 is returned as 5.3 and not as 5.300000190734863
+        metrics = np.round(self._metrics[row, rows].T.astype(float), DECIMALS)
+        return self._years[rows], metrics
+
+
+@dataclass
+class ClimateArchiveWriter:
+    """Writes a new version of the climate archive, one location at a time
+
+    The archive file is only referenced by the index once it is published, so running
+    workers keep reading the previous version until they reopen the archive.
+    """
+
+    archive: ClimateArchive
+    query: str
+    locations: list[tuple[float, float]]
+    _file: str = field(default="", init=False, repr=False)
+    _metrics: np.memmap | None = field(default=None, init=False, repr=False)
+    _reference: ClimateSeries | None = field(default=None, init=False, repr=False)
+    _written: np.ndarray | None = field(default=None, init=False, repr=False)
+
+    def add(self, row: int, series: ClimateSeries) -> bool:
+        """Write the series of a location
+
+        Args:
+            row: index of the location in the locations
+            series: series of the location
+
+        Returns:
+            bool: whether the series was written, series with other days than the first one are skipped
+        """
+        if self._reference is None:
+            self._create(series)
+        elif not (
+            np.array_equal(series.years, self._reference.years)
+            and np.array_equal(series.starts, self._reference.starts)
+        ):
+            return False
+        self._metrics[row] = series.metrics.T
+        self._written[row] = True
+        return True
+
+    def publish(self) -> None:
+        """Point the index to the new archive and remove the older versions"""
+        if self._reference is None:
+            return
+        self._metrics.flush()
+        locations = np.array(self.locations, dtype=float).reshape(-1, 2)
+        locations[~self._written] = np.nan
+        with tempfile.NamedTemporaryFile(
+            dir=self.archive.path, suffix=".npz", delete=False
+        ) as f:
+            np.savez(
+                f,
+                query=self.query,
+                archive=os.path.basename(self._file),
+                locations=locations,
+                years=self._reference.years,
+                starts=self._reference.starts,
+            )
+        os.replace(f.name, self.archive.index)
+        # Workers that still map an older version keep it until they reopen the archive
+        for file in glob.glob(os.path.join(self.archive.path, "*.f32")):
+            if file != self._file:
+                os.remove(file)
+        self.archive.open()
+
+    def _create(self, series: ClimateSeries) -> None:
+        os.makedirs(self.archive.path, exist_ok=True)
+        self._reference = series
+        self._file = os.path.join(self.archive.path, f"archive-{time.time_ns()}.f32")
+        self._metrics = np.memmap(
+            self._file,
+            dtype=np.float32,
+            mode="w+",
+            shape=(len(self.locations), series.years.size, len(CLIMATE_METRICS)),
+        )
+        self._metrics[:] = np.nan
+        self._written = np.zeros(len(self.locations), dtype=bool)
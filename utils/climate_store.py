@@ -0,0 +1,146 @@
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date
+
+import numpy as np
+from utils.parsers.open_meteo import CLIMATE_METRICS, parse_times
+from utils.settings import CLIMATE_STORE
+
+# First day of each month in a leap year, so that every month-day has its own slot (0-365)
+MONTH_STARTS = np.array([0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335])
+
+
+def month_day_slots(dates: np.ndarray) -> np.ndarray:
+    """Get the slot of the month and day of each date, the same for every year
+
+    Args:
+        dates: dates of the series (datetime64[D])
+
+    Returns:
+        np.ndarray: slot (0-365) of each date, February 29 has its own slot
+    """
+    months = dates.astype("datetime64[M]")
+    return MONTH_STARTS[months.astype(int) % 12] + (dates - months).astype(int)
+
+
+@dataclass
+class ClimateSeries:
+    """Daily climate series of a location, sorted by month-day so that the same day
+    across all years is one contiguous slice
+    """
+
+    years: np.ndarray
+    metrics: np.ndarray
+    starts: np.ndarray
+
+    @classmethod
+    def from_response(
+        cls, response: dict[str, list[float | int | str] | float | int | str]
+    ) -> "ClimateSeries":
+        """Build the series from an Open-Meteo climate response
+
+        Args:
+            response: response from API call (daily weather data for a location)
+
+        Returns:
+            ClimateSeries: series of the location, missing values (None) are NaN
+        """
+        daily = response["daily"]
+        dates = parse_times(daily["time"])
+        slots = month_day_slots(dates)
+        order = np.argsort(slots, kind="stable")
+        metrics = np.array(
+            [daily[series] for series in CLIMATE_METRICS.values()], dtype=float
+        ).reshape(len(CLIMATE_METRICS), dates.size)
+        return cls(
+            years=dates[order].astype("datetime64[Y]").astype(int) + 1970,
+            metrics=metrics[:, order],
+            starts=np.searchsorted(slots[order], np.arange(367)),
+        )
+
+    def same_day(self, day: date) -> tuple[np.ndarray, np.ndarray]:
+        """Get the same day throughout the years
+
+        Args:
+            day: day to get
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: year of each row and values of the climate metrics (metric x year)
+        """
+        slot = MONTH_STARTS[day.month - 1] + day.day - 1
+        rows = slice(self.starts[slot], self.starts[slot + 1])
+        return self.years[rows], self.metrics[:, rows]
+
+
+@dataclass
+class ClimateStore:
+    """Keeps the daily climate series of each location in local NumPy files
+
+    The series do not expire, the key of a series includes the climate model and the
+    date range, so a series is only fetched again when those change. Recently used
+    series are kept in an in-memory LRU.
+    """
+
+    path: str = CLIMATE_STORE["path"]
+    size: int = CLIMATE_STORE["size"]
+    _lru: OrderedDict = field(default_factory=OrderedDict, init=False, repr=False)
+
+    def get(self, key: str) -> ClimateSeries | None:
+        """Get the series of a location
+
+        Args:
+            key: query of the series (location, units, model and date range)
+
+        Returns:
+            ClimateSeries | None: series of the location, or None if it is not stored yet
+        """
+        if key in self._lru:
+            self._lru.move_to_end(key)
+            return self._lru[key]
+        try:
+            with np.load(self.file(key)) as arrays:
+                series = ClimateSeries(**arrays)
+        except FileNotFoundError:
+            return None
+        self._remember(key, series)
+        return series
+
+    def save(self, key: str, series: ClimateSeries) -> None:
+        """Store the series of a location
+
+        Args:
+            key: query of the series (location, units, model and date range)
+            series: series of the location
+        """
+        os.makedirs(self.path, exist_ok=True)
+        # Written to a temporary file first, so that other workers never read a partial file
+        with tempfile.NamedTemporaryFile(
+            dir=self.path, suffix=".npz", delete=False
+        ) as f:
+            np.savez(
+                f, years=series.years, metrics=series.metrics, starts=series.starts
+            )
+        os.replace(f.name, self.file(key))
+        self._remember(key, series)
+
+    def file(self, key: str) -> str:
+        """Get the file a series is stored in
+
+        Args:
+            key: query of the series
+
+        Returns:
+            str: path of the file
+        """
+        return os.path.join(
+            self.path, f"{hashlib.sha256(key.encode()).hexdigest()}.npz"
+        )
+
+    def _remember(self, key: str, series: ClimateSeries) -> None:
+        self._lru[key] = series
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.size:
+            self._lru.popitem(last=False)
@@ -0,0 +1,119 @@
+import gzip
+from typing import Callable
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from utils.settings import COMPRESSION
+
+try:
+    import brotli
+except ImportError:  # optional, responses are compressed with gzip without it
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional, responses are compressed with gzip without it
+    zstandard = None
+
+# Available encodings, in order of preference
+ENCODERS: dict[str, Callable[[bytes], bytes]] = {}
+if zstandard is not None:
+    ENCODERS["zstd"] = zstandard.ZstdCompressor(
+        level=COMPRESSION["zstd_level"]
+    ).compress
+if brotli is not None:
+    ENCODERS["br"] = lambda data: brotli.compress(
+        data, quality=COMPRESSION["brotli_quality"]
+    )
+ENCODERS["gzip"] = lambda data: gzip.compress(
+    data, compresslevel=COMPRESSION["gzip_level"], mtime=0
+)
+
+
+def negotiate(accept_encoding: str | None) -> str | None:
+    """Pick the encoding of a response from the Accept-Encoding header
+
+    Args:
+        accept_encoding: value of the Accept-Encoding header
+
+    Returns:
+        str | None: accepted encoding with the highest quality, ties are broken by the
+        preference of the server, or None if the client accepts none of them
+    """
+    accepted = {}
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.partition(";")
+        try:
+            quality = float(params.strip().removeprefix("q=")) if params else 1.0
+        except ValueError:
+            quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    candidates = [
+        (accepted.get(encoding, accepted.get("*", 0.0)), -preference, encoding)
+        for preference, encoding in enumerate(ENCODERS)
+    ]
+    quality, _, encoding = max(candidates)
+    return encoding if quality > 0 else None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compress a response body
+
+    Args:
+        data: body of the response
+        encoding: one of the available encodings, see negotiate
+
+    Returns:
+        bytes: compressed body
+    """
+    return ENCODERS[encoding](data)
+
+
+class CompressionMiddleware:
+    """Compresses responses with the best encoding the client accepts
+
+    Small responses, streamed responses and responses that are already encoded
+    (e.g. pre-compressed cached responses) are sent as they are.
+    """
+
+    def __init__(
+        self, app: ASGIApp, minimum_size: int = COMPRESSION["minimum_size"]
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        encoding = (
+            negotiate(Headers(scope=scope).get("accept-encoding"))
+            if scope["type"] == "http"
+            else None
+        )
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        start: Message | None = None
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                # Held back until the first body tells whether to compress
+                start = message
+                return
+            if start is not None:
+                headers = MutableHeaders(raw=start["headers"])
+                body = message.get("body", b"")
+                if (
+                    "content-encoding" not in headers
+                    and not message.get("more_body", False)
+                    and len(body) >= self.minimum_size
+                ):
+                    body = compress(body, encoding)
+                    headers["Content-Encoding"] = encoding
+                    headers["Content-Length"] = str(len(body))
+                    headers.add_vary_header("Accept-Encoding")
+                    message = {**message, "body": body}
+                await send(start)
+                start = None
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
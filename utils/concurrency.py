@@ -0,0 +1,164 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, TypeVar
+
+from fastapi import HTTPException
+
+T = TypeVar("T")
+
+
+async def with_deadline(awaitable: Awaitable[T], seconds: float, name: str) -> T:
+    """Await a branch of a request, giving up once its deadline passes
+
+    Args:
+        awaitable: the upstream call to wait for
+        seconds: deadline for the call
+        name: name of the branch, used in the error message
+
+    Raises:
+        HTTPException: if the deadline passes before the call finishes
+
+    Returns:
+        T: result of the upstream call
+    """
+    try:
+        return await asyncio.wait_for(awaitable, seconds)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"Timed out fetching {name} data")
+
+
+@dataclass
+class SingleFlight:
+    """Deduplicates concurrent calls, callers with the same key share one in-flight call"""
+
+    _calls: dict[str, asyncio.Task] = field(
+        default_factory=dict, init=False, repr=False
+    )
+
+    async def do(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        """Run the call for a key, or wait for the one already in flight
+
+        The shared call is shielded, so a caller giving up (e.g. on its deadline) does not
+        cancel it for the other callers.
+
+        Args:
+            key: key identifying identical calls
+            func: function starting the call
+
+        Returns:
+            T: result of the shared call
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._done(key, done))
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        """Get the number of calls currently in flight"""
+        return len(self._calls)
+
+    def _done(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the error as retrieved, the callers still get it
+        if not task.cancelled():
+            task.exception()
+
+
+@dataclass
+class BlockingPool:
+    """Bounded thread pool for the blocking calls of a third-party SDK (e.g. Pyrebase or Stripe)
+
+    Each SDK gets its own pool, so a slow service only ties up its own threads and never
+    the event loop. Calls beyond the queue limit are rejected right away, and callers
+    stop waiting once the timeout passes.
+    """
+
+    name: str
+    max_workers: int = 8
+    max_queue: int = 64
+    timeout: float = 10.0
+    running: int = field(default=0, init=False)
+    pending: int = field(default=0, init=False)
+    completed: int = field(default=0, init=False)
+    rejected: int = field(default=0, init=False)
+    timeouts: int = field(default=0, init=False)
+    _executor: ThreadPoolExecutor | None = field(default=None, init=False, repr=False)
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False
+    )
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run a blocking call in the pool
+
+        Args:
+            func: blocking function to call
+            *args: positional arguments of the function
+            **kwargs: keyword arguments of the function
+
+        Raises:
+            HTTPException: if the queue of the pool is full, or the call times out
+
+        Returns:
+            T: result of the call, exceptions of the call are raised as they are
+        """
+        if self.pending - self.running >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail=f"{self.name} is overloaded")
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                self.max_workers, thread_name_prefix=self.name
+            )
+        with self._lock:
+            self.pending += 1
+        job = self._executor.submit(self._call, func, args, kwargs)
+        job.add_done_callback(self._finished)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(job), self.timeout)
+        except asyncio.TimeoutError:
+            # A call that already started keeps its thread until it returns
+            self.timeouts += 1
+            raise HTTPException(
+                status_code=504, detail=f"Timed out calling {self.name}"
+            )
+
+    def stats(self) -> dict[str, int]:
+        """Get the counters of the pool
+
+        Returns:
+            dict[str, int]: calls running and waiting in the pool, and the completed, rejected and timed out calls
+        """
+        return {
+            "workers": self.max_workers,
+            "running": self.running,
+            "queued": self.pending - self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+    def shutdown(self) -> None:
+        """Stop the threads of the pool once their calls finish, called on app shutdown"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _call(self, func: Callable[..., T], args: tuple, kwargs: dict) -> T:
+        with self._lock:
+            self.running += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    def _finished(self, job: Future) -> None:
+        with self._lock:
+            self.pending -= 1
+            # Queued calls that timed out are cancelled before they start
+            if not job.cancelled():
+                self.completed += 1
@@ -1,8 +1,92 @@
+import warnings
 from datetime import date
 
+import numpy as np
 from models.weather import AirQuality, ClimateStats
 
 
+# Names of the climate metrics in the response, and the names of the daily Open-Meteo series they come from
+CLIMATE_METRICS = {
+    "temp": "temperature_2m_mean",
+    "wind_speed": "windspeed_10m_mean",
+    "humidity": "relative_humidity_2m_mean",
+    "rain": "precipitation_sum",
+    "clouds": "cloudcover_mean",
+    "pressure": "pressure_msl_mean",
+}
+
+
+# Names of the air quality pollutants, in the order they are returned for each day
+AIR_QUALITY_POLLUTANTS = [
+    "european_aqi",
+    "european_aqi_pm2_5",
+    "european_aqi_pm10",
+    "european_aqi_no2",
+    "european_aqi_o3",
+    "european_aqi_so2",
+]
+
+
+def parse_times(times: list[str], unit: str = "D") -> np.ndarray:
+    """Convert the times of a daily or hourly series to a NumPy array
+
+    Open-Meteo returns contiguous series, so the times are only parsed one by one if they are not.
+
+    Args:
+        times: times of the series ("YYYY-MM-DD" or "YYYY-MM-DDTHH:MM")
+        unit: step of the series, "D" for daily and "h" for hourly
+
+    Returns:
+        np.ndarray: times of the series (datetime64)
+    """
+    if not times:
+        return np.array([], dtype=f"datetime64[{unit}]")
+    parsed = np.datetime64(times[0], unit) + np.arange(len(times))
+    if parsed[-1] != np.datetime64(times[-1], unit):
+        parsed = np.array(times, dtype="datetime64[m]").astype(f"datetime64[{unit}]")
+    return parsed
+
+
+def same_day_mask(dates: np.ndarray, day: date) -> np.ndarray:
+    """Select the dates that fall on the same month and day as the given one, in any year
+
+    Args:
+        dates: dates to select from (datetime64[D])
+        day: day to match
+
+    Returns:
+        np.ndarray: boolean mask of the matching dates
+    """
+    months = dates.astype("datetime64[M]")
+    return (months.astype(int) % 12 + 1 == day.month) & (
+        (dates - months).astype(int) + 1 == day.day
+    )
+
+
+def nan_percentiles(values: np.ndarray, q: list[float]) -> np.ndarray:
+    """Percentiles of each row ignoring NaN, same as np.nanpercentile(values, q, axis=1)
+    but without a Python loop over the rows
+
+    Args:
+        values: 2D array, missing values are NaN
+        q: percentiles to compute
+
+    Returns:
+        np.ndarray: percentiles (percentile x row), NaN for rows without values
+    """
+    ordered = np.sort(values, axis=1)  # NaN is sorted last
+    counts = (~np.isnan(values)).sum(axis=1)
+    position = np.maximum(counts - 1, 0)[:, None] * (np.asarray(q) / 100)
+    low = np.floor(position).astype(int)
+    high = np.ceil(position).astype(int)
+    rows = np.arange(values.shape[0])[:, None]
+    result = ordered[rows, low] + (ordered[rows, high] - ordered[rows, low]) * (
+        position - low
+    )
+    result[counts == 0] = np.nan
+    return result.T
+
+
 class OpenMeteoParser:
     @staticmethod
     def historical_data(
@@ -10,73 +94,154 @@ class OpenMeteoParser:
     ) -> ClimateStats:
         """Parses the historical data to only get the same day throughout the years
 
+        Not used when serving requests, they read the same day from the parsed series
+        in the climate store or archive, see ClimateSeries.same_day and climate_stats.
+
         Args:
             response: response from API call (daily weather data for a location)
 
         Returns:
             dict: yearly data for the same day
         """
-        climate_stats = []
-        new_keys = [
-            "temp",
-            "wind_speed",
-            "humidity",
-            "rain",
-            "clouds",
-            "pressure",
-            "title",
+        daily = response["daily"]
+        dates = parse_times(daily["time"])
+        rows = np.flatnonzero(same_day_mask(dates, date.today())).tolist()
+        # Only the selected rows are converted, missing values (None) become NaN
+        metrics = np.array(
+            [
+                [daily[series][row] for row in rows]
+                for series in CLIMATE_METRICS.values()
+            ],
+            dtype=float,
+        ).reshape(len(CLIMATE_METRICS), len(rows))
+        years = dates[rows].astype("datetime64[Y]").astype(int) + 1970
+        return OpenMeteoParser.climate_stats(years, metrics)
+
+    @staticmethod
+    def climate_stats(years: np.ndarray, metrics: np.ndarray) -> ClimateStats:
+        """Build the climate statistics for the same day throughout the years
+
+        Args:
+            years: year of each row
+            metrics: values of the climate metrics (metric x year), missing values are NaN
+
+        Returns:
+            ClimateStats: yearly data for the same day, with a summary of each metric
+        """
+        values = np.nan_to_num(metrics, nan=0.0)
+        climate = [
+            {**dict(zip(CLIMATE_METRICS, row)), "title": year}
+            for row, year in zip(values.T.tolist(), years.tolist())
         ]
-        today = date.today().strftime("%m-%d")
-        for x, *params in zip(
-            response["daily"]["time"],
-            response["daily"]["temperature_2m_mean"],
-            response["daily"]["windspeed_10m_mean"],
-            response["daily"]["relative_humidity_2m_mean"],
-            response["daily"]["precipitation_sum"],
-            response["daily"]["cloudcover_mean"],
-            response["daily"]["pressure_msl_mean"],
-        ):
-            temp_dict = {}
-            year, month_day = x.split("-", 1)
-            all_params = params + [year]
-            if month_day == today:
-                for metric, key in zip(all_params, new_keys):
-                    if metric:
-                        temp_dict[key] = metric
-                    else:
-                        temp_dict[key] = 0
-                climate_stats.append(temp_dict)
-        return ClimateStats(climate=climate_stats)
+        return ClimateStats(
+            climate=climate, summary=OpenMeteoParser.climate_summary(years, metrics)
+        )
+
+    @staticmethod
+    def climate_summary(
+        years: np.ndarray, metrics: np.ndarray
+    ) -> dict[str, dict[str, float]]:
+        """Summarize each climate metric over the years
+
+        Args:
+            years: year of each row
+            metrics: values of the climate metrics (metric x year), missing values are NaN
+
+        Returns:
+            dict[str, dict[str, float]]: mean, percentiles and trend (per year) of each metric
+        """
+        if not years.size:
+            return {}
+        with warnings.catch_warnings():
+            # Metrics missing for every year are summarized as 0
+            warnings.simplefilter("ignore", RuntimeWarning)
+            stats = np.vstack(
+                [
+                    np.nanmean(metrics, axis=1),
+                    nan_percentiles(metrics, [10, 50, 90]),
+                    [OpenMeteoParser.trend(years, values) for values in metrics],
+                ]
+            )
+        stats = np.nan_to_num(stats, nan=0.0).T.tolist()
+        return {
+            name: dict(zip(("mean", "p10", "median", "p90", "trend"), values))
+            for name, values in zip(CLIMATE_METRICS, stats)
+        }
+
+    @staticmethod
+    def trend(years: np.ndarray, values: np.ndarray) -> float:
+        """Get the linear trend of a metric, per year
+
+        Args:
+            years: year of each value
+            values: values of the metric, missing values are NaN
+
+        Returns:
+            float: slope of the least squares line through the values
+        """
+        known = ~np.isnan(values)
+        if np.unique(years[known]).size < 2:
+            return 0.0
+        x = years[known] - years[known].mean()
+        return float((x * (values[known] - values[known].mean())).sum() / (x * x).sum())
 
     @staticmethod
     def air_quality(
-        response: dict[str, list[float | int | str] | float | int | str]
+        response: dict[str, list[float | int | str] | float | int | str],
+        mean: bool = False,
+        percentiles: tuple[int, ...] = (),
     ) -> AirQuality:
         """Gets the air quality data and parses it to get the highest AQI for each day (5 day forecast)
 
         Args:
             response: response from API call (hourly air quality data for a location)
+            mean: also get the mean AQI for each day
+            percentiles: also get these percentiles of the AQI for each day
 
         Returns:
             air_quality: highest AQI for each day
         """
-        air_quality = {}
-        for x, *params in zip(
-            response["hourly"]["time"],
-            response["hourly"]["european_aqi"],
-            response["hourly"]["european_aqi_pm2_5"],
-            response["hourly"]["european_aqi_pm10"],
-            response["hourly"]["european_aqi_no2"],
-            response["hourly"]["european_aqi_o3"],
-            response["hourly"]["european_aqi_so2"],
-        ):
-            if x.split("T")[0] not in air_quality:
-                air_quality[x.split("T")[0]] = [0] * len(params)
-            for idx, aqi in enumerate(params):
-                if aqi:
-                    air_quality[x.split("T")[0]][idx] = (
-                        aqi
-                        if air_quality[x.split("T")[0]][idx] < aqi
-                        else air_quality[x.split("T")[0]][idx]
-                    )
-        return AirQuality(aqi=air_quality)
+        hourly = response["hourly"]
+        hours = parse_times(hourly["time"], "h")
+        if not hours.size:
+            return AirQuality(aqi={})
+
+        # Place every hour in a days x 24 x pollutants grid, hours without data are NaN
+        first_day = hours[0].astype("datetime64[D]")
+        offsets = (hours - first_day.astype("datetime64[h]")).astype(int)
+        days = first_day + np.arange(offsets[-1] // 24 + 1)
+        grid = np.full((days.size * 24, len(AIR_QUALITY_POLLUTANTS)), np.nan)
+        grid[offsets] = np.array(
+            [hourly[pollutant] for pollutant in AIR_QUALITY_POLLUTANTS], dtype=float
+        ).T
+        grid = grid.reshape(days.size, 24, len(AIR_QUALITY_POLLUTANTS))
+
+        # Only keep the days present in the response
+        present = np.zeros(days.size, dtype=bool)
+        present[offsets // 24] = True
+        labels = np.datetime_as_string(days[present]).tolist()
+        grid = grid[present]
+
+        # Missing values count as 0, like an AQI of 0
+        maxima = np.nan_to_num(grid, nan=0.0).max(axis=1, initial=0.0)
+        means, daily_percentiles = {}, {}
+        with warnings.catch_warnings():
+            # Pollutants missing for a whole day are summarized as 0
+            warnings.simplefilter("ignore", RuntimeWarning)
+            if mean:
+                values = np.nan_to_num(np.nanmean(grid, axis=1), nan=0.0)
+                means = dict(zip(labels, values.tolist()))
+            if percentiles:
+                by_hour = grid.transpose(0, 2, 1).reshape(-1, 24)
+                values = np.nan_to_num(
+                    nan_percentiles(by_hour, list(percentiles)), nan=0.0
+                ).reshape(len(percentiles), len(labels), len(AIR_QUALITY_POLLUTANTS))
+                daily_percentiles = {
+                    f"p{percentile}": dict(zip(labels, daily.tolist()))
+                    for percentile, daily in zip(percentiles, values)
+                }
+        return AirQuality(
+            aqi=dict(zip(labels, maxima.tolist())),
+            mean=means,
+            percentiles=daily_percentiles,
+        )
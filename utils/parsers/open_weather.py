@@ -1,3 +1,4 @@
+from models.compact import CompactForecast
 from models.weather import CurrentWeather, Forecast
 
 
@@ -53,7 +54,45 @@ class OpenWeatherParser:
         Returns:
             Forecast: 5 day forecast data for the city (in 3 hour intervals)
         """
-        data = {
+        return Forecast(**OpenWeatherParser.forecast_data(response))
+
+    @staticmethod
+    def compact_forecast(
+        response: dict[
+            str,
+            dict[str, str]
+            | list[dict[str, int | list[dict[str, str]] | dict[str, float | int]]],
+        ],
+    ) -> CompactForecast:
+        """Parse the response from the API call to get the forecast data in its compact form
+
+        Args:
+            response: Response from OpenWeatherMap API
+
+        Returns:
+            CompactForecast: 5 day forecast data for the city (in 3 hour intervals)
+        """
+        return CompactForecast.from_forecasts(
+            **OpenWeatherParser.forecast_data(response)
+        )
+
+    @staticmethod
+    def forecast_data(
+        response: dict[
+            str,
+            dict[str, str]
+            | list[dict[str, int | list[dict[str, str]] | dict[str, float | int]]],
+        ],
+    ) -> dict:
+        """Get the forecast data from the response of the API call
+
+        Args:
+            response: Response from OpenWeatherMap API
+
+        Returns:
+            dict: location and 3 hour forecasts, in the schema of Forecast
+        """
+        return {
             "name": response["city"]["name"],
             "country": response["city"]["country"],
             "lat": response["city"]["coord"]["lat"],
@@ -81,4 +120,3 @@ class OpenWeatherParser:
                 for weather in response["list"]
             ],
         }
-        return Forecast(**data)
@@ -0,0 +1,203 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from fastapi import HTTPException
+
+if TYPE_CHECKING:
+    from aioredis import Redis
+
+# Order in which queued calls get the upstream quota, background refreshes only get what the requests leave
+PRIORITIES = {"paid": 0, "free": 1, "background": 2}
+
+# Priority of the upstream calls made in the current context, set per request from the tier of the user
+quota_priority: ContextVar[str] = ContextVar("quota_priority", default="free")
+
+
+@dataclass
+class TokenBucket:
+    """Token bucket of an upstream quota, kept by the worker
+
+    Used on its own when Redis is not available, the fleet shares a RedisTokenBucket.
+    """
+
+    calls_per_minute: int
+    burst: int
+    granted: int = field(default=0, init=False)
+    _tokens: float | None = field(default=None, init=False, repr=False)
+    _updated: float = field(default=0.0, init=False, repr=False)
+
+    @property
+    def rate(self) -> float:
+        return self.calls_per_minute / 60
+
+    async def take(self) -> float:
+        """Take a token for one upstream call
+
+        Returns:
+            float: 0 if a token was taken, otherwise how long (in seconds) until the next one
+        """
+        now = time.monotonic()
+        tokens = self.burst if self._tokens is None else self._tokens
+        tokens = min(self.burst, tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if tokens >= 1:
+            self._tokens = tokens - 1
+            self.granted += 1
+            return 0.0
+        self._tokens = tokens
+        return (1 - tokens) / self.rate
+
+    async def stats(self) -> dict[str, float]:
+        """Get the burn of the quota
+
+        Returns:
+            dict[str, float]: calls granted, tokens left and the limit
+        """
+        tokens = self.burst if self._tokens is None else self._tokens
+        tokens = min(
+            self.burst, tokens + (time.monotonic() - self._updated) * self.rate
+        )
+        return {
+            "granted": self.granted,
+            "tokens": round(tokens, 2),
+            "calls_per_minute": self.calls_per_minute,
+        }
+
+
+@dataclass
+class RedisTokenBucket(TokenBucket):
+    """Token bucket of an upstream quota stored in Redis, shared by all workers of the app
+
+    The bucket is refilled and taken from in one script, with the clock of Redis, so the
+    workers cannot overdraw the quota between them. Granted calls are counted in Redis.
+    """
+
+    redis: "Redis" = field(kw_only=True)
+    key: str = "quota:openweathermap"
+    stats_key: str = "quota-stats:openweathermap"
+
+    # Refill the bucket, then take a token or return how long until the next one
+    TAKE_SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(bucket[1]) or burst
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + math.max(now - updated, 0) * rate)
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        redis.call('HINCRBY', KEYS[2], 'granted', 1)
+    else
+        wait = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return tostring(wait)
+    """
+
+    def __post_init__(self):
+        self._take = self.redis.register_script(self.TAKE_SCRIPT)
+
+    async def take(self) -> float:
+        wait = float(
+            await self._take(
+                keys=[self.key, self.stats_key], args=[self.rate, self.burst]
+            )
+        )
+        if wait == 0:
+            self.granted += 1
+        return wait
+
+    async def stats(self) -> dict[str, float]:
+        bucket = await self.redis.hmget(self.key, "tokens", "updated")
+        stats = await self.redis.hgetall(self.stats_key)
+        return {
+            "granted": int(stats.get(b"granted", 0)),
+            "tokens": round(float(bucket[0]), 2) if bucket[0] else self.burst,
+            "calls_per_minute": self.calls_per_minute,
+        }
+
+
+@dataclass
+class QuotaScheduler:
+    """Hands out the tokens of an upstream quota, queueing the calls that cannot get one
+
+    Queued calls get the next tokens in the order of their priority, see PRIORITIES.
+    A call that does not get a token within max_wait is rejected, so it can be served
+    from the cache instead.
+    """
+
+    name: str
+    bucket: TokenBucket
+    max_wait: float = 2.0
+    granted: Counter = field(default_factory=Counter, init=False)
+    rejected: Counter = field(default_factory=Counter, init=False)
+    _queue: list = field(default_factory=list, init=False, repr=False)
+    _order: itertools.count = field(
+        default_factory=itertools.count, init=False, repr=False
+    )
+    _pump: asyncio.Task | None = field(default=None, init=False, repr=False)
+
+    async def acquire(self, priority: str | None = None) -> None:
+        """Wait for a token of the quota
+
+        Args:
+            priority: priority of the call, the priority of the current context if not given
+
+        Raises:
+            HTTPException: if no token is available within max_wait
+        """
+        priority = priority or quota_priority.get()
+        if not self._queue and await self.bucket.take() == 0:
+            self.granted[priority] += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (PRIORITIES[priority], next(self._order), future))
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(future, self.max_wait)
+        except asyncio.TimeoutError:
+            self.rejected[priority] += 1
+            raise HTTPException(
+                status_code=503, detail=f"{self.name} quota is exhausted"
+            )
+        self.granted[priority] += 1
+
+    async def stats(self) -> dict:
+        """Get the burn of the quota and the calls granted, queued and rejected by priority
+
+        Returns:
+            dict: stats of the bucket, with the counters of this worker
+        """
+        return {
+            **await self.bucket.stats(),
+            "queued": sum(not future.done() for *_, future in self._queue),
+            "granted_by_priority": dict(self.granted),
+            "rejected_by_priority": dict(self.rejected),
+        }
+
+    async def _run(self) -> None:
+        while self._queue:
+            if self._queue[0][2].done():
+                # The call gave up waiting
+                heapq.heappop(self._queue)
+                continue
+            wait = await self.bucket.take()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            while self._queue:
+                *_, future = heapq.heappop(self._queue)
+                if not future.done():
+                    future.set_result(None)
+                    break
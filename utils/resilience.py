@@ -0,0 +1,178 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, TypeVar
+
+from fastapi import HTTPException
+
+T = TypeVar("T")
+
+
+def is_failure(error: BaseException) -> bool:
+    """Check whether an error of an upstream call means the upstream is failing
+
+    Client errors (e.g. city not found) are answers of a healthy upstream.
+
+    Args:
+        error: error raised by the call
+
+    Returns:
+        bool: whether the error counts against the upstream
+    """
+    if isinstance(error, HTTPException):
+        return error.status_code >= 500
+    return isinstance(error, Exception)
+
+
+@dataclass
+class CircuitBreaker:
+    """Stops calling an upstream that keeps failing or is too slow, so requests fail fast
+
+    The breaker opens once enough of the recent calls failed, or took longer than the slow
+    call threshold. While open every call is rejected, after open_seconds a few probe
+    calls are let through (half-open): the breaker closes if they succeed and opens again
+    if they fail.
+    """
+
+    name: str
+    window: int = 20
+    min_calls: int = 10
+    failure_rate: float = 0.5
+    slow_call: float = 5.0
+    open_seconds: float = 30.0
+    probes: int = 1
+    state: str = field(default="closed", init=False)
+    _outcomes: deque = field(default_factory=deque, init=False, repr=False)
+    _opened_at: float = field(default=0.0, init=False, repr=False)
+    _probing: int = field(default=0, init=False, repr=False)
+
+    async def call(
+        self,
+        func: Callable[[], Awaitable[T]],
+        failed: Callable[[T], bool] = lambda _: False,
+    ) -> T:
+        """Call the upstream through the breaker
+
+        Args:
+            func: function starting the upstream call
+            failed: whether a result of the call counts as a failure (e.g. a 5xx response)
+
+        Raises:
+            HTTPException: if the breaker is open
+
+        Returns:
+            T: result of the call, errors of the call are raised as they are
+        """
+        probe = self._admit()
+        started = time.monotonic()
+        try:
+            result = await func()
+        except BaseException as e:
+            self._record(
+                not is_failure(e) and time.monotonic() - started < self.slow_call,
+                probe,
+            )
+            raise
+        self._record(
+            not failed(result) and time.monotonic() - started < self.slow_call, probe
+        )
+        return result
+
+    def stats(self) -> dict[str, float | str]:
+        """Get the state of the breaker
+
+        Returns:
+            dict[str, float | str]: state and failure rate of the recent calls
+        """
+        return {"state": self.state, "failure_rate": self._failure_rate()}
+
+    def _admit(self) -> bool:
+        if self.state == "open":
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                raise HTTPException(
+                    status_code=503, detail=f"{self.name} upstream is unavailable"
+                )
+            self.state = "half-open"
+        if self.state == "half-open":
+            if self._probing >= self.probes:
+                raise HTTPException(
+                    status_code=503, detail=f"{self.name} upstream is unavailable"
+                )
+            self._probing += 1
+            return True
+        return False
+
+    def _record(self, success: bool, probe: bool) -> None:
+        if probe:
+            self._probing -= 1
+            if success:
+                self.state = "closed"
+                self._outcomes.clear()
+            else:
+                self._open()
+            return
+        self._outcomes.append(success)
+        if len(self._outcomes) > self.window:
+            self._outcomes.popleft()
+        if (
+            self.state == "closed"
+            and len(self._outcomes) >= self.min_calls
+            and self._failure_rate() >= self.failure_rate
+        ):
+            self._open()
+
+    def _open(self) -> None:
+        self.state = "open"
+        self._opened_at = time.monotonic()
+
+    def _failure_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return 1 - sum(self._outcomes) / len(self._outcomes)
+
+
+@dataclass
+class Bulkhead:
+    """Limits the concurrent calls to an upstream, so a slow upstream cannot take all the resources of a worker"""
+
+    name: str
+    max_concurrent: int = 32
+    max_wait: float = 1.0
+    _semaphore: asyncio.Semaphore | None = field(default=None, init=False, repr=False)
+
+    async def run(self, func: Callable[[], Awaitable[T]]) -> T:
+        """Call the upstream once a slot is free
+
+        Args:
+            func: function starting the upstream call
+
+        Raises:
+            HTTPException: if no slot frees up within max_wait
+
+        Returns:
+            T: result of the call
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.max_wait)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail=f"{self.name} upstream is busy")
+        try:
+            return await func()
+        finally:
+            self._semaphore.release()
+
+    def stats(self) -> dict[str, int]:
+        """Get the usage of the bulkhead
+
+        Returns:
+            dict[str, int]: calls in flight and the limit
+        """
+        free = (
+            self._semaphore._value
+            if self._semaphore is not None
+            else self.max_concurrent
+        )
+        return {"in_flight": self.max_concurrent - free, "limit": self.max_concurrent}
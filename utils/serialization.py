@@ -0,0 +1,55 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+from models.compact import CompactForecast
+from models.weather import SerializedModel
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def dumps(value: Any) -> bytes:
+    """Serialize a value to JSON, reusing the JSON kept by the models
+
+    Args:
+        value: model, compact forecast or JSON serializable value
+
+    Returns:
+        bytes: JSON of the value
+    """
+    if isinstance(value, (SerializedModel, CompactForecast)):
+        return value.json_bytes()
+    return orjson.dumps(value)
+
+
+def ndjson_line(section: str, value: Any) -> bytes:
+    """Serialize a section of a streamed response to one NDJSON line
+
+    Args:
+        section: name of the section
+        value: model, compact forecast or JSON serializable value
+
+    Returns:
+        bytes: JSON of the section tagged with its name, ending with a newline
+    """
+    return b'{"section":' + orjson.dumps(section) + b',"data":' + dumps(value) + b"}\n"
+
+
+class SerializedJSONResponse(JSONResponse):
+    """JSON response for a dict of models and plain values, or for pre-serialized JSON bytes
+
+    The dict is joined from the JSON of its values, so the models are not encoded
+    again by FastAPI and keep their serialization for the next requests.
+    """
+
+    def render(self, content: dict[str, Any] | bytes) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return (
+            b"{"
+            + b",".join(
+                orjson.dumps(key) + b":" + dumps(value)
+                for key, value in content.items()
+            )
+            + b"}"
+        )
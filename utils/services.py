@@ -1,3 +1,9 @@
+import unicodedata
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from utils.settings import COORDINATE_GRID_STEP
+
+
 def parse_query(params: dict[str, float | str]) -> str:
     """Convert a dict of query params to a string that can be used in a URL
 
@@ -9,6 +15,7 @@ def parse_query(params: dict[str, float | str]) -> str:
     """
     return "&".join([f"{key}={value}" for key, value in params.items()])
 
+
 def units_appendix(units: str) -> str:
     """Append units to the URL for the API call according to query
 
@@ -22,4 +29,82 @@ def units_appendix(units: str) -> str:
         "&temperature_unit=fahrenheit&windspeed_unit=mph"
         if units == "imperial"
         else "&windspeed_unit=ms"
-    )
\ No newline at end of file
+    )
+
+
+def normalize_url(url: str) -> str:
+    """Normalize an upstream URL so that identical requests get the same key
+
+    The query params are sorted, the city name is case folded and the API key is left out.
+
+    Args:
+        url: URL of the upstream API call
+
+    Returns:
+        str: normalized URL
+    """
+    parts = urlsplit(url)
+    params = sorted(
+        (key, " ".join(value.split()).casefold() if key == "q" else value.strip())
+        for key, value in parse_qsl(parts.query)
+        if key != "appid"
+    )
+    return urlunsplit(
+        (parts.scheme, parts.netloc.lower(), parts.path, urlencode(params), "")
+    )
+
+
+def quantize_coordinates(
+    params: dict[str, float | str],
+    keys: tuple[str, str] = ("lat", "lon"),
+    step: float = COORDINATE_GRID_STEP,
+) -> dict[str, float | str]:
+    """Snap the coordinates in the query params to a grid, so that nearby locations share cache entries
+
+    Args:
+        params: Query params for the API call
+        keys: names of the latitude and longitude params
+        step: grid step in degrees
+
+    Returns:
+        dict[str, float | str]: Query params with the snapped coordinates
+    """
+    if not step or not all(key in params for key in keys):
+        return params
+    return {
+        **params,
+        **{key: round(round(float(params[key]) / step) * step, 6) for key in keys},
+    }
+
+
+def normalize_city(name: str) -> str:
+    """Normalize a city name so that different spellings of the same name match
+
+    Case, whitespace and diacritics are ignored, e.g. " Zürich ,CH" matches "zurich, ch".
+
+    Args:
+        name: city name as sent by the client
+
+    Returns:
+        str: normalized city name
+    """
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(char for char in name if not unicodedata.combining(char))
+    return ",".join(" ".join(part.split()) for part in name.casefold().split(","))
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Check whether an If-None-Match header matches an ETag
+
+    Args:
+        if_none_match: value of the If-None-Match header, a list of ETags or "*"
+        etag: current ETag of the response
+
+    Returns:
+        bool: whether the client already has the current response
+    """
+    if not if_none_match:
+        return False
+    # If-None-Match uses the weak comparison, the W/ prefix is ignored
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
@@ -18,3 +18,177 @@ UNITS = {
     "metric": METRIC_UNITS,
     "imperial": IMPERIAL_UNITS,
 }
+
+
+# Connection pool limits for each upstream host, the pool is kept alive for the lifetime of the app
+DEFAULT_UPSTREAM_LIMITS = {
+    "max_connections": 20,
+    "max_keepalive_connections": 10,
+    "keepalive_expiry": 30.0,
+}
+
+UPSTREAM_LIMITS = {
+    "api.openweathermap.org": {
+        "max_connections": 50,
+        "max_keepalive_connections": 20,
+        "keepalive_expiry": 30.0,
+    },
+    "air-quality-api.open-meteo.com": {
+        "max_connections": 20,
+        "max_keepalive_connections": 10,
+        "keepalive_expiry": 30.0,
+    },
+    "climate-api.open-meteo.com": {
+        "max_connections": 10,
+        "max_keepalive_connections": 5,
+        "keepalive_expiry": 30.0,
+    },
+}
+
+# Number of parsed upstream responses kept in memory by each worker
+PARSED_CACHE_SIZE = 1024
+
+# Number of composed weather responses kept in memory by each worker
+RESPONSE_CACHE_SIZE = 1000
+
+# Timeouts (in seconds) for the upstream calls
+UPSTREAM_TIMEOUT = {
+    "connect": 3.0,
+    "read": 10.0,
+    "write": 5.0,
+    "pool": 5.0,
+}
+
+# Deadlines (in seconds) for each branch of a weather request
+UPSTREAM_DEADLINES = {
+    "weather": 5.0,
+    "forecast": 5.0,
+    "air-quality": 8.0,
+    "climate": 15.0,
+}
+
+# How long (in seconds) the responses of each upstream endpoint are cached
+CACHE_TTL = {
+    "weather": 600,
+    "forecast": 3600,
+    "air-quality": 3600,
+    "climate": 86400,
+}
+
+# How long (in seconds) after it expires a response can still be served, while it is refreshed in the background
+STALE_WINDOW = {
+    "weather": 0,
+    "forecast": 1800,
+    "air-quality": 0,
+    "climate": 86400,
+}
+
+# The most requested upstream responses are refreshed before they expire
+HOT_REFRESH = {
+    "top_k": 50,
+    "interval": 60,
+}
+
+# Grid step (in degrees) the coordinates are snapped to before calling the upstream APIs, 0.01° is about 1 km
+COORDINATE_GRID_STEP = 0.01
+
+# Index of city names to coordinates, learned from previous responses
+CITY_INDEX = {
+    "size": 10000,
+    "ttl": 30 * 86400,
+}
+
+# How long (in seconds) the tier of a user is cached, it is invalidated when the tier changes
+TIER_CACHE_TTL = 3600
+
+# Local store of the daily climate series of each location, the most recently used series are kept in memory
+CLIMATE_STORE = {
+    "path": "climate_store",
+    "size": 256,
+}
+
+# Memory-mapped archive of the daily climate series of the tracked locations, written by scripts/ingest_climate.py
+CLIMATE_ARCHIVE_PATH = "climate_archive"
+
+# Compression of the responses, brotli and zstd are used when their packages are installed
+COMPRESSION = {
+    "minimum_size": 1024,
+    "gzip_level": 6,
+    "brotli_quality": 5,
+    "zstd_level": 3,
+}
+
+# Thread pools for the blocking calls of the third-party SDKs, each with its own limits
+BLOCKING_POOLS = {
+    "firebase": {"max_workers": 8, "max_queue": 64, "timeout": 10.0},
+    "stripe": {"max_workers": 4, "max_queue": 16, "timeout": 20.0},
+}
+
+# Circuit breaker of each upstream, it opens when too many of the recent calls fail or take longer than slow_call seconds
+CIRCUIT_BREAKERS = {
+    "weather": {
+        "window": 20,
+        "min_calls": 10,
+        "failure_rate": 0.5,
+        "slow_call": 3.0,
+        "open_seconds": 30.0,
+        "probes": 1,
+    },
+    "forecast": {
+        "window": 20,
+        "min_calls": 10,
+        "failure_rate": 0.5,
+        "slow_call": 3.0,
+        "open_seconds": 30.0,
+        "probes": 1,
+    },
+    "air-quality": {
+        "window": 20,
+        "min_calls": 10,
+        "failure_rate": 0.5,
+        "slow_call": 5.0,
+        "open_seconds": 60.0,
+        "probes": 1,
+    },
+    "climate": {
+        "window": 20,
+        "min_calls": 5,
+        "failure_rate": 0.5,
+        "slow_call": 10.0,
+        "open_seconds": 120.0,
+        "probes": 1,
+    },
+}
+
+# Concurrent calls allowed to each upstream, and how long (in seconds) a call waits for a free slot
+UPSTREAM_BULKHEADS = {
+    "weather": {"max_concurrent": 40, "max_wait": 1.0},
+    "forecast": {"max_concurrent": 40, "max_wait": 1.0},
+    "air-quality": {"max_concurrent": 16, "max_wait": 1.0},
+    "climate": {"max_concurrent": 8, "max_wait": 2.0},
+}
+
+# How long (in seconds) a weather response missing some of its paid sections is cached
+PARTIAL_RESPONSE_TTL = 60
+
+# Batch weather requests: locations per request, and locations fetched at once by each worker across all batches
+BATCH_LIMITS = {
+    "max_locations": 50,
+    "concurrency": 16,
+}
+
+# Concurrent Open-Meteo cache misses collected for window seconds are sent as one multi-location request of at most max_size locations
+OPEN_METEO_BATCH = {
+    "window": 0.005,
+    "max_size": 50,
+}
+
+# Calls per minute of the OpenWeatherMap plan, shared by the whole fleet, and how long (in seconds) a call can wait for its turn
+OPEN_WEATHER_QUOTA = {
+    "calls_per_minute": 600,
+    "burst": 60,
+    "max_wait": 2.0,
+}
+
+# How long (in seconds) after its stale window an upstream response is kept, to be served when the upstream cannot be called
+FALLBACK_WINDOW = 3600